@@ -12,7 +12,9 @@ setup(
     include_package_data=True,
 
     entry_points={'console_scripts':
-                  ['caes-sync-daemon = caes.sync:sync']},
+                  ['caes-sync-daemon = caes.sync:sync',
+                   'caes-sync-verify = caes.verify:verify',
+                   'caes-sync-replay = caes.replay:replay']},
 
     install_requires=[
         'cassandra-driver==2.1.4',
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+
+from caes import metrics
+
+
+class AIMD(object):
+    """
+    Batch size controlled by additive increase, multiplicative decrease: it grows by
+    increase after every batch that took at most target_latency seconds and had at
+    most max_error_rate of its items fail, and is multiplied by decrease after a
+    batch that failed or timed out. The current size is exported as the gauge name.
+    """
+
+    def __init__(self, name, initial, minimum=1, maximum=1000, increase=1, decrease=0.5,
+                 target_latency=1.0, max_error_rate=0.01):
+        self.__logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._name = name
+        self._minimum = minimum
+        self._maximum = max(minimum, maximum)
+        self._increase = increase
+        self._decrease = decrease
+        self._target_latency = target_latency
+        self._max_error_rate = max_error_rate
+        self._gauge = metrics.gauge(name)
+
+        self._set(initial)
+
+    @property
+    def size(self):
+        return self._size
+
+    def _set(self, size):
+        self._size = int(min(self._maximum, max(self._minimum, size)))
+        self._gauge.set(self._size)
+
+    def success(self, latency, errors=0, total=1):
+        with self._lock:
+            if total > 0 and float(errors) / total > self._max_error_rate:
+                self._set(self._size * self._decrease)
+                self.__logger.debug("%s down to %d, %d of %d failed", self._name, self._size, errors, total)
+            elif latency <= self._target_latency:
+                self._set(self._size + self._increase)
+
+    def failure(self):
+        with self._lock:
+            self._set(self._size * self._decrease)
+            self.__logger.debug("%s down to %d", self._name, self._size)
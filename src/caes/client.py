@@ -2,17 +2,36 @@
 
 import json
 import logging
+import time
 
+from itertools import chain
+from Queue import Queue
 from uuid import UUID
-from cassandra import OperationTimedOut, InvalidRequest, Timeout
-from cassandra.query import dict_factory
-from elasticsearch import Elasticsearch
-from cassandra.cluster import Cluster
+from multiprocessing.pool import ThreadPool
+from cassandra import OperationTimedOut, InvalidRequest, Timeout, Unavailable
+from cassandra.query import dict_factory, BatchStatement, BatchType, SimpleStatement
+from elasticsearch import Elasticsearch, helpers
+from cassandra.cluster import NoHostAvailable
+from cassandra.concurrent import execute_concurrent
 from elasticsearch.client.indices import IndicesClient
 from elasticsearch.exceptions import ImproperlyConfigured, ElasticsearchException
+from caes.aimd import AIMD
+from caes.echo import EchoFilter
+from caes.mapping import Mapping
+from caes.ratelimit import RateLimiter, check_rate
+from caes.record import MAX_SHAPES, Record, as_record
+from caes.schema import TableSchema
+from caes.tuning import cassandra_cluster, es_params
+from caes.utils import coalesce
 
 
 class CassandraClient(object):
+    # Settings reconfigure can change while connected.
+    RECONFIGURABLE = ('insert_query', 'ttl', 'mapping', 'max_docs_per_second', 'max_bytes_per_second')
+
+    # Rows fetch reads before yielding them, as a multiple of concurrency.
+    FETCH_WINDOW = 10
+
     def __init__(self,
                  keyspace,
                  data_column_family,
@@ -22,11 +41,23 @@ class CassandraClient(object):
                  data_id_field_name='did',
                  timestamp_field_name='timestamp',
                  cassandra_driver_params=dict(),
-                 ttl=3600
+                 ttl=3600,
+                 batch_policy='logged',
+                 batch_size=50,
+                 concurrency=1,
+                 mapping=None,
+                 profile='default',
+                 max_batch_size=500,
+                 target_latency=1.0,
+                 max_docs_per_second=None,
+                 max_bytes_per_second=None,
+                 overflow_column=None
     ):
         self.__logger = logging.getLogger(__name__)
 
-        self._cluster = Cluster()
+        self._cluster, self._session_options = cassandra_cluster(cassandra_driver_params, profile)
+        self._session = None
+        self._select = None
         self._keyspace = keyspace
         self._timeseries_column_family = timeseries_column_family
         self._timeseries_id_field_name = timeseries_id_field_name
@@ -36,52 +67,129 @@ class CassandraClient(object):
         self._insert_query = insert_query
         self._ttl = ttl
 
-        self.__last = []
+        if batch_policy not in ('logged', 'unlogged'):
+            raise ValueError("Unknown batch policy %s." % batch_policy)
+
+        self._batch_policy = batch_policy
+        self._concurrency = concurrency
+
+        # Documents per unlogged batch or, for logged batches, in flight at once.
+        if batch_policy == 'unlogged':
+            self._write_size = AIMD('cassandra.write.batch_size', batch_size, maximum=max_batch_size,
+                                    increase=max(1, batch_size // 5), target_latency=target_latency)
+        else:
+            self._write_size = AIMD('cassandra.write.batch_size', concurrency, maximum=concurrency,
+                                    increase=max(1, concurrency // 5), target_latency=target_latency)
+
+        self._limiter = RateLimiter('cassandra.write', max_docs_per_second, max_bytes_per_second)
+        self._mapping = Mapping(mapping)
+        self._inserts = dict()
+        self._overflow_column = overflow_column
+        self._table_schema = None
+
+        self.__last = EchoFilter()
+
+    def _connect(self):
+        """
+        Returns the client's session, connecting to the keyspace on first use.
+        """
+        if self._session is None:
+            session = self._cluster.connect(self._keyspace)
+            session.row_factory = dict_factory
+            for k, v in self._session_options.iteritems():
+                setattr(session, k, v)
+            self._session = session
+
+        return self._session
+
+    def _prepared_select(self, session):
+        """
+        Returns the statement reading a row of the data table by did, prepared once
+        for each session.
+        """
+        if self._select is None or self._select[0] is not session:
+            query = """
+                SELECT *
+                FROM %s
+                WHERE %s = ?
+            """ % (self._data_column_family,
+                   self._data_id_field_name)
+
+            self.__logger.debug(query)
+
+            self._select = (session, session.prepare(query))
+
+        return self._select[1]
 
-    def _get_by_timeseries_entry(self, tsentry):
-        did = tsentry.pop(self._data_id_field_name)
-        ts = tsentry.pop(self._timestamp_field_name)
+    def _execute_all(self, session, statements):
+        """
+        Executes (statement, parameters) pairs, keeping up to concurrency of them in
+        flight through the driver's async futures, and returns a (success,
+        result_or_exception) pair for each.
+        """
+        if self._concurrency > 1:
+            return execute_concurrent(session, statements,
+                                      concurrency=self._concurrency,
+                                      raise_on_first_error=False)
 
         results = []
+        for statement, parameters in statements:
+            try:
+                results.append((True, session.execute(statement, parameters)))
+            except (OperationTimedOut, Timeout, Unavailable, NoHostAvailable, InvalidRequest, KeyError) as e:
+                # KeyError: a document lacking a field insertQuery names, as
+                # execute_concurrent reports it.
+                results.append((False, e))
+            except:
+                raise
 
-        if (did, ts) in self.__last:
-            self.__logger.debug("%s already synced.", str(did))
-            return None, did, ts
+        return results
 
-        query = """
-            SELECT *
-            FROM %s
-            WHERE %s = ?
-        """ % (self._data_column_family,
-               self._data_id_field_name)
+    def _get_by_timeseries_entries(self, entries):
+        results = []
+        pending = []
 
-        self.__logger.debug(query)
+        for did, ts in entries:
+            if (did, ts) in self.__last:
+                self.__logger.debug("%s already synced.", str(did))
+                results.append(Record(None, None, did, ts))
+            else:
+                pending.append((did, ts))
+
+        if len(pending) == 0:
+            return results
 
         try:
-            session = self._cluster.connect(self._keyspace)
-            session.row_factory = dict_factory
-            prepared = session.prepare(query)
-            results = session.execute(prepared, (did,))
-            session.shutdown()
-        except (OperationTimedOut, Timeout, InvalidRequest) as e:
+            session = self._connect()
+            prepared = self._prepared_select(session)
+            responses = self._execute_all(session, [(prepared, (did,)) for did, _ in pending])
+        except (OperationTimedOut, Timeout, Unavailable, NoHostAvailable, InvalidRequest) as e:
             self.__logger.exception(e)
+            responses = [(False, e)] * len(pending)
         except:
             raise
 
-        if len(results) == 0:
-            self.__logger.warning("Doc %s does not exist.", str(did))
-            data = None
-        else:
-            data = results[0]
-            data.pop(self._data_id_field_name)
+        for (did, ts), (success, rows) in zip(pending, responses):
+            if not success:
+                self.__logger.error("Couldn't read %s: %s", str(did), rows)
+                data = None
+            elif len(rows) == 0:
+                self.__logger.warning("Doc %s does not exist.", str(did))
+                data = None
+            else:
+                data = rows[0]
+                data.pop(self._data_id_field_name)
+                data = self._mapping(data)
 
-        return data, did, ts
+            results.append(Record.from_dict(data, did, ts))
+
+        return results
 
     def _prepare_for_writing(self, cassdata):
-        return self._get_by_timeseries_entry(cassdata)
+        return self._get_by_timeseries_entries([cassdata])[0]
 
-    def latest(self, since):
-        results = []
+    def iter_latest(self, since):
+        entries = []
 
         self.__logger.info('Querying Cassandra for updates...')
 
@@ -98,116 +206,405 @@ class CassandraClient(object):
         self.__logger.debug(query)
 
         try:
-            session = self._cluster.connect(self._keyspace)
-            session.row_factory = dict_factory
-            results = session.execute(query)
-            session.shutdown()
+            results = self._connect().execute(query)
+            entries = coalesce((None, r[self._data_id_field_name], r[self._timestamp_field_name]) for r in results)
         except (OperationTimedOut, Timeout, InvalidRequest) as e:
             self.__logger.exception(e)
         except:
             raise
 
-        results = [self._prepare_for_writing(r) for r in results]
+        for r in self.fetch((did, ts) for _, did, ts in entries):
+            yield r
+
+    def fetch(self, entries):
+        """
+        Yields the (data, did, ts) entry, ready to be written to ES, for each (did, ts)
+        in entries. The rows are read FETCH_WINDOW times concurrency at a time, with
+        concurrency reads in flight, and yielded before the next ones are read, so
+        that only a window of them is ever held here.
+        """
+        size = self.FETCH_WINDOW * self._concurrency
+
+        window = []
+        for entry in entries:
+            window.append(entry)
+            if len(window) >= size:
+                for r in self._get_by_timeseries_entries(window):
+                    yield r
+                window = []
+
+        for r in self._get_by_timeseries_entries(window):
+            yield r
+
+    def latest(self, since):
+        results = list(self.iter_latest(since))
 
         self.__logger.info("Cassandra: %s", results)
 
         return results
 
+    def scan(self, fetch_size=1000):
+        """
+        Yields (data, did) for every row of the data table, as stored.
+        """
+        query = SimpleStatement("SELECT * FROM %s" % self._data_column_family, fetch_size=fetch_size)
+
+        for row in self._connect().execute(query):
+            did = row.pop(self._data_id_field_name)
+            yield row, did
+
     def flush(self):
         pass
 
-    def write(self, dlist):
+    def _build_insert_queries(self, columns, named):
+        if named:
+            placeholder = lambda f: "%(" + str(f) + ")s"
+        else:
+            placeholder = lambda f: "%s"
+
+        params = dict(keyspace=self._keyspace,
+                      ts_family=self._timeseries_column_family,
+                      dt_family=self._data_column_family,
+                      ts_id_name=self._timeseries_id_field_name,
+                      did_name=self._data_id_field_name,
+                      ts_field_name=self._timestamp_field_name,
+                      data_columns="".join(", " + f for f in columns),
+                      data_values="".join(", " + placeholder(f) for f in columns))
+
+        insert_schema_ts = "INSERT INTO %(ts_family)s (%(ts_id_name)s, %(ts_field_name)s, %(did_name)s) " % params
+        insert_values_ts = "VALUES (0, %s, %s) USING TTL " % (placeholder('ts'), placeholder('did')) + str(self._ttl)
+        insert_ts = insert_schema_ts + insert_values_ts
+
+        insert_schema_data = "INSERT INTO %(dt_family)s (%(did_name)s%(data_columns)s) " % params
+        insert_values_data = "VALUES (" + placeholder('did') + ("%(data_values)s) " % params)
+        insert_data = insert_schema_data + insert_values_data
+
+        return insert_ts, insert_data
+
+    def _build_inserts(self, record, schema=None):
+        """
+        Returns the timeseries and data inserts for record, conformed to schema if
+        there is one, each with its values. The inserts are cached by the conformed
+        record's shape, so documents of the same shape share them, and take its values
+        as they are, unless an insertQuery needs them by name. An insertQuery gets
+        every field of record, conformed or not, as it may name fields that are not
+        columns of the data table.
+        """
+        conformed = schema.conform(record) if schema is not None else record
+
+        named = bool(self._insert_query)
+        key = (conformed.columns, named)
+        inserts = self._inserts.get(key)
+        if inserts is None:
+            # Bounded like the shapes themselves.
+            if len(self._inserts) >= MAX_SHAPES:
+                self._inserts.clear()
+
+            inserts = self._build_insert_queries(conformed.columns, named)
+            self._inserts[key] = inserts
+
+        insert_ts, insert_data = inserts
+
+        if named:
+            values_dict = record.data
+            values_dict.update(conformed.data)
+            values_dict['did'] = record.did
+            values_dict['ts'] = record.ts
+            return insert_ts, values_dict, insert_data, values_dict
+
+        return insert_ts, (record.ts, record.did), insert_data, (record.did,) + conformed.values
+
+    def _chunks(self, dlist, size):
+        chunk = []
+        for record in dlist:
+            record = as_record(record)
+            if not record.has_data:
+                self.__logger.info("Data is None for id %s. Can't sync.", str(record.did))
+                continue
+
+            if self.__logger.isEnabledFor(logging.INFO):
+                self.__logger.info("Syncing from ES to Cassandra: %s", json.dumps(record.data))
+
+            # Registered before it is written, for reads running alongside this write.
+            self.__last.add(record.did, record.ts)
+            chunk.append(record)
+            if len(chunk) >= size():
+                yield chunk
+                chunk = []
+
+        if len(chunk) > 0:
+            yield chunk
+
+    def _write_logged(self, session, dlist, schema):
+        failed = []
+        for chunk in self._chunks(dlist, lambda: self._write_size.size):
+            statements = []
+            for record in chunk:
+                insert_ts, ts_values, insert_data, data_values = self._build_inserts(record, schema)
+
+                query = """
+                    BEGIN BATCH
+                        %s
+                        %s
+                        %s
+                    APPLY BATCH;
+                """ % (insert_ts, insert_data, self._insert_query)
+
+                self.__logger.debug(query)
+
+                values = data_values if ts_values is data_values else ts_values + data_values
+                statements.append((query, values))
+
+            self._limiter.throttle_entries(chunk)
+
+            start = time.time()
+            errors = 0
+            for entry, (success, result) in zip(chunk, self._execute_all(session, statements)):
+                if not success:
+                    self.__logger.error("Couldn't write %s: %s", str(entry.did), result)
+                    failed.append(entry)
+                    errors += 1
+
+            self._write_size.success(time.time() - start, errors, len(chunk))
+
+        return failed
+
+    def _write_unlogged(self, session, dlist, schema):
+        """
+        Writes each document's data row (and the user insertQuery) on its own, since
+        every one of them lives on a different partition, and groups the timeseries
+        entries, which all share partition 0, in unlogged batches of up to
+        batch_size statements. The timeseries entry is only written after its data row,
+        so readers never see an entry pointing to a missing row.
+        """
+        failed = []
+        for chunk in self._chunks(dlist, lambda: self._write_size.size):
+            statements = []
+            inserts_ts = []
+            for record in chunk:
+                insert_ts, ts_values, insert_data, data_values = self._build_inserts(record, schema)
+
+                if self._insert_query:
+                    query = """
+                        BEGIN UNLOGGED BATCH
+                            %s
+                            %s
+                        APPLY BATCH;
+                    """ % (insert_data, self._insert_query)
+                else:
+                    query = insert_data
+
+                self.__logger.debug(query)
+
+                statements.append((query, data_values))
+                inserts_ts.append((insert_ts, ts_values))
+
+            self._limiter.throttle_entries(chunk)
+
+            start = time.time()
+            errors = len(failed)
+
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            written = []
+            for entry, insert, (success, result) in zip(chunk, inserts_ts, self._execute_all(session, statements)):
+                if success:
+                    batch.add(*insert)
+                    written.append(entry)
+                else:
+                    self.__logger.error("Couldn't write %s: %s", str(entry.did), result)
+                    failed.append(entry)
+
+            if len(written) > 0:
+                self._execute_batch(session, batch, written, failed)
+
+            self._write_size.success(time.time() - start, len(failed) - errors, len(chunk))
+
+        return failed
+
+    def _execute_batch(self, session, batch, pending, failed):
         try:
-            session = self._cluster.connect(self._keyspace)
-        except (OperationTimedOut, Timeout) as e:
+            session.execute(batch)
+        except (OperationTimedOut, Timeout, Unavailable, NoHostAvailable, InvalidRequest) as e:
             self.__logger.exception(e)
-            return
+            failed.extend(pending)
         except:
             raise
 
-        last_synced = []
-        for data, did, ts in dlist:
-            if data is None:
-                self.__logger.info("Data is None for id %s. Can't sync.", str(did))
-                continue
-
-            kv = zip(*data.iteritems())
-
-            self.__logger.info("Syncing from ES to Cassandra: %s", json.dumps(data))
-
-            params = dict(keyspace=self._keyspace,
-                          ts_family=self._timeseries_column_family,
-                          dt_family=self._data_column_family,
-                          ts_id_name=self._timeseries_id_field_name,
-                          did_name=self._data_id_field_name,
-                          ts_field_name=self._timestamp_field_name,
-                          data_columns=", ".join(kv[0]),
-                          data_values=", ".join("%(" + str(f) + ")s" for f in kv[0]))
+    def set_rate_limits(self, docs_per_second=None, bytes_per_second=None):
+        self._limiter.set_rates(docs_per_second, bytes_per_second)
 
-            insert_schema_ts = "INSERT INTO %(ts_family)s (%(ts_id_name)s, %(ts_field_name)s, %(did_name)s) " % params
-            insert_values_ts = "VALUES (0, %(ts)s, %(did)s) USING TTL " + str(self._ttl)
-            insert_ts = insert_schema_ts + insert_values_ts
+    def reconfigure(self, insert_query="", ttl=3600, mapping=None, max_docs_per_second=None,
+                    max_bytes_per_second=None, dry_run=False):
+        """
+        Applies the settings that can change while connected: all of them or, if one
+        is invalid, none. With dry_run, they are only checked.
+        """
+        mapping = Mapping(mapping)
+        check_rate(max_docs_per_second)
+        check_rate(max_bytes_per_second)
 
-            insert_schema_data = "INSERT INTO %(dt_family)s (%(did_name)s, %(data_columns)s) " % params
-            insert_values_data = "VALUES (%(did)s, " + ("%(data_values)s) " % params)
-            insert_data = insert_schema_data + insert_values_data
-
-            query = """
-                BEGIN BATCH
-                    %s
-                    %s
-                    %s
-                APPLY BATCH;
-            """ % (insert_ts, insert_data, self._insert_query)
-
-            self.__logger.debug(query)
-
-            values_dict = dict(did=did, ts=ts)
-            for k, v in data.iteritems():
-                values_dict[k] = v
-
-            try:
-                session.execute(query, values_dict)
-            except (OperationTimedOut, Timeout, InvalidRequest) as e:
-                self.__logger.exception(e)
-            except:
-                raise
+        if dry_run:
+            return
 
-            last_synced.append((did, ts))
+        self._insert_query = insert_query
+        self._ttl = ttl
+        # The cached inserts embed the TTL.
+        self._inserts = dict()
+        self._mapping = mapping
+        self.set_rate_limits(max_docs_per_second, max_bytes_per_second)
+
+    def _schema(self):
+        """
+        Returns the TableSchema of the data table, or None if the driver has no
+        metadata for it. The driver replaces the table's metadata whenever its schema
+        changes, so a new one is built when that happens.
+        """
+        keyspace = self._cluster.metadata.keyspaces.get(self._keyspace)
+        table = keyspace.tables.get(self._data_column_family) if keyspace is not None else None
+        if table is None:
+            self.__logger.debug("No metadata for %s.%s.", self._keyspace, self._data_column_family)
+            return None
+
+        if self._table_schema is None or self._table_schema.table is not table:
+            self._table_schema = TableSchema(table, self._data_id_field_name, self._overflow_column)
+
+        return self._table_schema
+
+    @property
+    def echo_filter(self):
+        """
+        The entries this client wrote lately, for a client replacing it to take over.
+        """
+        return self.__last
+
+    @echo_filter.setter
+    def echo_filter(self, echo_filter):
+        self.__last = echo_filter
+
+    @property
+    def overflow_column(self):
+        return self._overflow_column
+
+    def conform(self, entry):
+        """
+        Returns the (data, did, ts) entry as write() would store it, conformed to the
+        data table's schema.
+        """
+        self._connect()
+
+        record = as_record(entry)
+        schema = self._schema()
+        return schema.conform(record) if schema is not None else record
 
+    def write(self, dlist):
+        """
+        Writes dlist, conformed to the data table's schema, and returns the
+        (data, did, ts) entries that failed.
+        """
         try:
-            session.shutdown()
-        except (OperationTimedOut, Timeout) as e:
+            session = self._connect()
+        except (OperationTimedOut, Timeout, NoHostAvailable) as e:
             self.__logger.exception(e)
+            return [r for r in (as_record(d) for d in dlist) if r.has_data]
         except:
             raise
 
-        self.__last = last_synced
+        schema = self._schema()
+
+        self.__last.rotate()
+
+        if self._batch_policy == 'unlogged':
+            failed = self._write_unlogged(session, dlist, schema)
+        else:
+            failed = self._write_logged(session, dlist, schema)
+
+        for entry in failed:
+            self.__last.discard(entry.did, entry.ts)
+
+        return failed
 
     def close(self):
+        if self._session is not None:
+            self._session.shutdown()
+
         self._cluster.shutdown()
 
 
 class ElasticSearchClient(object):
+    # Settings reconfigure can change while connected.
+    RECONFIGURABLE = ('include', 'exclude', 'mapping', 'max_docs_per_second', 'max_bytes_per_second')
+
     def __init__(self,
                  index,
                  doc_type,
                  es_driver_params=dict(),
                  exclude=None,
-                 include=None):
+                 include=None,
+                 concurrency=1,
+                 mapping=None,
+                 profile='default',
+                 target_latency=1.0,
+                 max_docs_per_second=None,
+                 max_bytes_per_second=None,
+                 slices=1):
         self.__logger = logging.getLogger(__name__)
 
         self._index = index
         self._doc_type = doc_type
         self._timestamp_field_name = '_timestamp'
         self._data_id_field_name = '_id'
+        self._mapping = Mapping(mapping, include, exclude)
+        self._concurrency = concurrency
+        self._page_size = AIMD('es.read.page_size', 50, minimum=10, maximum=1000, increase=10,
+                               target_latency=target_latency)
+        self._write_size = AIMD('es.write.batch_size', 50, minimum=1, maximum=1000, increase=10,
+                                target_latency=target_latency)
+        self._limiter = RateLimiter('es.write', max_docs_per_second, max_bytes_per_second)
+
+        es_driver_params = es_params(es_driver_params, profile)
+
+        self._pool = None
+        if concurrency > 1:
+            self._pool = ThreadPool(concurrency)
+
+        self._slices = slices
+        self._readers = ThreadPool(slices) if slices > 1 else None
+
+        if concurrency > 1 or slices > 1:
+            es_driver_params.setdefault('maxsize', concurrency + slices)
+
         self._es = Elasticsearch(**es_driver_params)
-        self._exclude = exclude
-        self._include = include
 
         self._iclient = self._es.indices
 
-        self.__last = []
+        self.__last = EchoFilter()
+
+    @property
+    def echo_filter(self):
+        """
+        The entries this client wrote lately, for a client replacing it to take over.
+        """
+        return self.__last
+
+    @echo_filter.setter
+    def echo_filter(self, echo_filter):
+        self.__last = echo_filter
+
+    @property
+    def _include(self):
+        return self._mapping.include
+
+    @_include.setter
+    def _include(self, include):
+        self._mapping = Mapping(self._mapping.rules, include, self._exclude)
+
+    @property
+    def _exclude(self):
+        return self._mapping.exclude
+
+    @_exclude.setter
+    def _exclude(self, exclude):
+        self._mapping = Mapping(self._mapping.rules, self._include, exclude)
 
     def _prepare_for_writing(self, esdata):
         data = esdata['_source']
@@ -216,76 +613,244 @@ class ElasticSearchClient(object):
 
         if (did, ts) in self.__last:
             self.__logger.debug("%s already synced.", str(did))
-            return None, did, ts
-
-        res_list = None
-        if self._include is not None:
-            res_list = [(k, v) for k, v in data.iteritems() if k in self._include]
-        elif self._exclude is not None:
-            res_list = [(k, v) for k, v in data.iteritems() if k not in self._exclude]
+            return Record(None, None, did, ts)
+
+        return Record.from_dict(self._mapping(data), did, ts)
+
+    def _ranges(self, since):
+        """
+        Splits the window from since to now in up to slices ranges of whole seconds,
+        the last one left open for documents timestamped later.
+        """
+        span = int(time.time()) - since
+        n = max(1, min(self._slices, span))
+        width = span // n
+
+        bounds = [since + i * width for i in range(n)]
+        ranges = [{"gte": lower, "lt": upper} for lower, upper in zip(bounds, bounds[1:])]
+        ranges.append({"gte": bounds[-1]})
+
+        return ranges
+
+    def _pages(self, time_range):
+        """
+        Yields the pages of (data, did, ts) entries timestamped within time_range.
+        """
+        query = {"query": {"constant_score": {"filter": {"range": {self._timestamp_field_name: time_range}}}}}
+
+        offset = 0
+        while True:
+            start = time.time()
+            try:
+                res = self._es.search(index=self._index,
+                                      body=query,
+                                      version=True,
+                                      from_=offset,
+                                      size=self._page_size.size)['hits']['hits']
+            except (ImproperlyConfigured, ElasticsearchException) as e:
+                self.__logger.exception(e)
+                self._page_size.failure()
+                return
+            except:
+                raise
 
-        if res_list is not None:
-            data = dict(res_list)
+            self._page_size.success(time.time() - start)
 
-        return data, did, ts
+            if len(res) == 0:
+                break
 
-    def latest(self, since):
-        results = []
-        query = {"query": {"constant_score": {"filter": {"range": {self._timestamp_field_name: {"gte": since}}}}}}
+            yield [self._prepare_for_writing(r) for r in res]
 
-        self.__logger.info('Querying Elastic Search for updates...')
+            offset += len(res)
 
+    def _read_slice(self, time_range, pages):
         try:
-            results = []
-            offset = 0
-            while True:
-                res = self._es.search(index=self._index,
-                                      body=query,
-                                      version=True,
-                                      from_=offset,
-                                      size=50)['hits']['hits']
-                if len(res) == 0:
-                    break
+            for page in self._pages(time_range):
+                pages.put(page)
+        except Exception as e:
+            self.__logger.exception(e)
+            pages.put(e)
+        finally:
+            pages.put(None)
+
+    def iter_latest(self, since):
+        """
+        Yields the (data, did, ts) entries changed since since. With slices, the window
+        is split in time ranges searched in parallel, their pages yielded as they come.
+        """
+        self.__logger.info('Querying Elastic Search for updates...')
 
-                results.extend(res)
-                offset += 50
+        if self._readers is None:
+            for page in self._pages({"gte": since}):
+                for r in page:
+                    yield r
+            return
 
-        except (ImproperlyConfigured, ElasticsearchException) as e:
-            self.__logger.exception(e)
-        except:
-            raise
+        ranges = self._ranges(since)
+        pages = Queue()
+        for time_range in ranges:
+            self._readers.apply_async(self._read_slice, (time_range, pages))
+
+        done = 0
+        while done < len(ranges):
+            page = pages.get()
+            if page is None:
+                done += 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                for r in page:
+                    yield r
 
-        results = [self._prepare_for_writing(r) for r in results]
+    def latest(self, since):
+        results = list(self.iter_latest(since))
 
         self.__logger.info('Elastic Search: %s', results)
 
         return results
 
+    def scan(self, size=500):
+        """
+        Yields the (data, did, ts) entry, ready to be written to Cassandra, for every
+        document of the index.
+        """
+        for hit in helpers.scan(self._es,
+                                query={"query": {"match_all": {}}},
+                                index=self._index,
+                                doc_type=self._doc_type,
+                                version=True,
+                                size=size):
+            yield self._prepare_for_writing(hit)
+
+    def get(self, dids, size=500):
+        """
+        Yields the (data, did, ts) entry, ready to be written to Cassandra, for each of
+        dids found in the index, fetched size at a time.
+        """
+        dids = list(dids)
+        for i in range(0, len(dids), size):
+            docs = self._es.mget(body={"ids": [str(did) for did in dids[i:i + size]]},
+                                 index=self._index,
+                                 doc_type=self._doc_type)['docs']
+            for doc in docs:
+                if doc.get('found'):
+                    yield self._prepare_for_writing(doc)
+
     def flush(self):
         self._iclient.flush(index=self._index)
 
-    def write(self, dlist):
-        last_synced = []
-        for data, did, ts in dlist:
-            if data is None:
-                self.__logger.warning("Data is None for id %s. Can't sync.", str(did))
+    def _chunks(self, dlist, size):
+        chunk = []
+        for record in dlist:
+            record = as_record(record)
+            if not record.has_data:
+                self.__logger.warning("Data is None for id %s. Can't sync.", str(record.did))
                 continue
 
-            self.__logger.info("Syncing from Cassandra to ES: %s", json.dumps(data))
+            if self.__logger.isEnabledFor(logging.INFO):
+                self.__logger.info("Syncing from Cassandra to ES: %s", json.dumps(record.data))
 
-            try:
-                self._es.index(self._index, self._doc_type, data, did, timestamp=ts, version=ts, version_type="external")
-            except (ImproperlyConfigured, ElasticsearchException) as e:
-                self.__logger.exception(e)
-            except:
-                raise
+            self.__last.add(record.did, record.ts)
+            chunk.append(record)
+            if len(chunk) >= size():
+                yield chunk
+                chunk = []
+
+        if len(chunk) > 0:
+            yield chunk
 
-            last_synced.append((did, ts))
+    def _bulk(self, chunk):
+        """
+        Indexes chunk in a single bulk request and returns, for each entry, True if it
+        was written, False if it failed and None if a newer version was already there.
+        """
+        body = []
+        for record in chunk:
+            body.append({"index": {"_id": str(record.did), "_timestamp": record.ts, "_version": record.ts,
+                                   "_version_type": "external"}})
+            body.append(record.data)
 
-        self.__last = last_synced
+        self._limiter.throttle_entries(chunk)
+
+        start = time.time()
+        try:
+            items = self._es.bulk(body=body, index=self._index, doc_type=self._doc_type)['items']
+        except (ImproperlyConfigured, ElasticsearchException) as e:
+            self.__logger.exception(e)
+            self._write_size.failure()
+            return [False] * len(chunk)
+        except:
+            raise
+
+        written = []
+        for did, item in zip((r.did for r in chunk), items):
+            result = item.values()[0]
+            status = result.get('status', 500)
+            if status == 409:
+                self.__logger.info("A newer version of %s is already in ES.", str(did))
+                written.append(None)
+            elif status >= 300:
+                self.__logger.error("Couldn't index %s: %s", str(did), result.get('error'))
+                written.append(False)
+            else:
+                written.append(True)
+
+        self._write_size.success(time.time() - start, written.count(False), len(chunk))
+
+        return written
+
+    def set_rate_limits(self, docs_per_second=None, bytes_per_second=None):
+        self._limiter.set_rates(docs_per_second, bytes_per_second)
+
+    def reconfigure(self, include=None, exclude=None, mapping=None, max_docs_per_second=None,
+                    max_bytes_per_second=None, dry_run=False):
+        """
+        Applies the settings that can change while connected: all of them or, if one
+        is invalid, none. With dry_run, they are only checked.
+        """
+        mapping = Mapping(mapping, include, exclude)
+        check_rate(max_docs_per_second)
+        check_rate(max_bytes_per_second)
+
+        if dry_run:
+            return
+
+        self._mapping = mapping
+        self.set_rate_limits(max_docs_per_second, max_bytes_per_second)
+
+    def write(self, dlist):
+        """
+        Writes dlist in bulk requests, up to concurrency of them at a time, and returns
+        the (data, did, ts) entries that failed.
+        """
+        self.__last.rotate()
+
+        failed = []
+        for chunk in self._chunks(dlist, lambda: self._write_size.size * self._concurrency):
+            size = self._write_size.size
+            batches = [chunk[i:i + size] for i in range(0, len(chunk), size)]
+
+            if self._pool is not None:
+                written = self._pool.map(self._bulk, batches)
+            else:
+                written = [self._bulk(batch) for batch in batches]
+
+            for entry, ok in zip(chunk, chain(*written)):
+                if ok is not True:
+                    self.__last.discard(entry.did, entry.ts)
+                if ok is False:
+                    failed.append(entry)
+
+        return failed
 
     def close(self):
-        pass
+        if self._readers is not None:
+            self._readers.close()
+            self._readers.join()
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
 
 
 
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+
+class EchoFilter(object):
+    """
+    The (did, ts) entries a client wrote during its last few writes, so that reading
+    them back can be told apart from a change to sync. Each write starts a new
+    generation with rotate and only the last generations are kept. Entries are added
+    before they are written, so that a read running at the same time as the write
+    already skips them, and discarded again if the write fails.
+    """
+
+    def __init__(self, generations=2):
+        self._size = generations
+        self._generations = (set(),)
+
+    def rotate(self):
+        # Replaced rather than changed in place, so concurrent lookups see either.
+        self._generations = (set(),) + self._generations[:self._size - 1]
+
+    def add(self, did, ts):
+        self._generations[0].add((did, ts))
+
+    def discard(self, did, ts):
+        for generation in self._generations:
+            generation.discard((did, ts))
+
+    def __contains__(self, entry):
+        for generation in self._generations:
+            if entry in generation:
+                return True
+
+        return False
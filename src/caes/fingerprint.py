@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from collections import OrderedDict
+from os.path import exists, dirname
+from caes.spill import write_record, read_records
+
+
+def fingerprint(data):
+    """
+    Returns a digest of data that doesn't depend on key order or on null fields,
+    so that a document and its copy on the other side hash the same.
+    """
+    data = dict((k, v) for k, v in data.iteritems() if v is not None)
+    return hashlib.md5(json.dumps(data, sort_keys=True, separators=(',', ':'), default=unicode)).digest()
+
+
+class FingerprintCache(object):
+    """
+    Least recently used cache of the fingerprint of the payload last synced for each
+    did, holding up to max_items of them. When path is given, the cache is loaded
+    from there and written back by save.
+    """
+
+    def __init__(self, max_items=100000, path=None, chunk_size=1000):
+        self.__logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._max_items = max_items
+        self._path = path
+        self._chunk_size = chunk_size
+
+        if path is not None and exists(path):
+            with open(path, 'rb') as f:
+                for chunk in read_records(f):
+                    for did, fp in chunk:
+                        self._items[did] = fp
+            self._evict()
+
+            self.__logger.info("%d fingerprints loaded from %s", len(self._items), path)
+
+    def __len__(self):
+        return len(self._items)
+
+    def _evict(self):
+        while len(self._items) > self._max_items:
+            self._items.popitem(last=False)
+
+    def get(self, did):
+        with self._lock:
+            fp = self._items.pop(did, None)
+            if fp is not None:
+                self._items[did] = fp
+
+            return fp
+
+    def set(self, did, fp):
+        with self._lock:
+            self._items.pop(did, None)
+            self._items[did] = fp
+            self._evict()
+
+    def discard(self, did):
+        with self._lock:
+            self._items.pop(did, None)
+
+    def save(self):
+        if self._path is None:
+            return
+
+        if dirname(self._path) and not exists(dirname(self._path)):
+            os.makedirs(dirname(self._path))
+
+        with self._lock:
+            items = self._items.items()
+
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for i in range(0, len(items), self._chunk_size):
+                write_record(f, items[i:i + self._chunk_size])
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.rename(tmp_path, self._path)
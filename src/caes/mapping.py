@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+
+from importlib import import_module
+from uuid import UUID
+
+
+def _to_bool(v):
+    if isinstance(v, basestring):
+        return v.strip().lower() in ('true', '1', 'yes', 'y')
+
+    return bool(v)
+
+
+def _to_uuid(v):
+    return v if isinstance(v, UUID) else UUID(str(v))
+
+
+def _to_json(v):
+    return v if isinstance(v, basestring) else json.dumps(v)
+
+
+COERCIONS = {
+    'int': int,
+    'float': float,
+    'text': unicode,
+    'str': unicode,
+    'bool': _to_bool,
+    'uuid': _to_uuid,
+    'json': _to_json
+}
+
+
+def _load_function(path):
+    module, _, name = path.rpartition(':') if ':' in path else path.rpartition('.')
+    return getattr(import_module(module), name)
+
+
+def reverse(rules):
+    """
+    Returns the rules undoing the renames in rules, for the opposite sync direction.
+    """
+    return [dict(field=r['rename'], rename=r['field']) for r in rules or [] if r.get('rename') is not None]
+
+
+class Mapping(object):
+    """
+    Field mapping compiled once into a single per-document pass. Each rule is a dict
+    with a 'field' and one or more of:
+
+    - rename: the name the field gets on the destination;
+    - type: one of COERCIONS' keys, the value is coerced to it;
+    - drop: if true, the field is not synced;
+    - format: %(name)s style template over the source fields, which computes 'field';
+    - function: 'module:function' path to a callable taking the source document and
+      returning the value of 'field'.
+
+    include and exclude keep their meaning from ElasticSearchConfig, include winning.
+    """
+
+    def __init__(self, rules=None, include=None, exclude=None):
+        self.__logger = logging.getLogger(__name__)
+
+        self._rules = list(rules or [])
+        self._include = frozenset(include) if include is not None else None
+        self._exclude = frozenset(exclude) if exclude is not None and include is None else frozenset()
+
+        self._renames = dict()
+        self._coercions = dict()
+        self._derived = []
+
+        drops = set()
+        for rule in self._rules:
+            field = rule['field']
+
+            if rule.get('format') is not None:
+                self._derived.append((field, rule['format'].__mod__))
+            elif rule.get('function') is not None:
+                self._derived.append((field, _load_function(rule['function'])))
+
+            if rule.get('drop'):
+                drops.add(field)
+
+            if rule.get('rename') is not None:
+                self._renames[field] = rule['rename']
+
+            if rule.get('type') is not None:
+                if rule['type'] not in COERCIONS:
+                    raise ValueError("Unknown type %s for field %s." % (rule['type'], field))
+                self._coercions[field] = COERCIONS[rule['type']]
+
+        self._exclude = self._exclude | drops
+        self._identity = (self._include is None and len(self._exclude) == 0 and len(self._renames) == 0 and
+                          len(self._coercions) == 0 and len(self._derived) == 0)
+
+    @property
+    def rules(self):
+        return self._rules
+
+    @property
+    def include(self):
+        return self._include
+
+    @property
+    def exclude(self):
+        return self._exclude
+
+    def __call__(self, data):
+        if self._identity or data is None:
+            return data
+
+        include = self._include
+        exclude = self._exclude
+        renames = self._renames
+        coercions = self._coercions
+
+        result = dict()
+        for k, v in data.iteritems():
+            if (include is not None and k not in include) or k in exclude:
+                continue
+
+            coerce = coercions.get(k)
+            if coerce is not None and v is not None:
+                try:
+                    v = coerce(v)
+                except (ValueError, TypeError) as e:
+                    self.__logger.warning("Dropping field %s, can't coerce %r: %s", k, v, e)
+                    continue
+
+            result[renames.get(k, k)] = v
+
+        for field, derive in self._derived:
+            try:
+                v = derive(data)
+                coerce = coercions.get(field)
+                if coerce is not None and v is not None:
+                    v = coerce(v)
+            except (KeyError, ValueError, TypeError) as e:
+                self.__logger.warning("Can't compute field %s: %s", field, e)
+                continue
+
+            result[renames.get(field, field)] = v
+
+        return result
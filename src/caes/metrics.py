@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import threading
+
+from collections import deque
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+_lock = threading.Lock()
+_metrics = dict()
+
+
+class Counter(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, n=1):
+        with self._lock:
+            self._value += n
+
+    def snapshot(self):
+        return self._value
+
+
+class Gauge(object):
+    def __init__(self):
+        self._value = None
+
+    def set(self, value):
+        self._value = value
+
+    def snapshot(self):
+        return self._value
+
+
+class Histogram(object):
+    """
+    Keeps the last window observations and summarizes them as percentiles, along
+    with the total number of observations ever made.
+    """
+
+    def __init__(self, window=10000):
+        self._lock = threading.Lock()
+        self._values = deque(maxlen=window)
+        self._count = 0
+
+    def observe(self, value):
+        with self._lock:
+            self._values.append(value)
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            values = sorted(self._values)
+            count = self._count
+
+        if len(values) == 0:
+            return dict(count=count)
+
+        def percentile(p):
+            return values[min(len(values) - 1, int(p * len(values)))]
+
+        return dict(count=count,
+                    p50=percentile(0.5),
+                    p90=percentile(0.9),
+                    p99=percentile(0.99),
+                    max=values[-1])
+
+
+def _get(name, cls):
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls()
+
+    if not isinstance(metric, cls):
+        raise ValueError("Metric %s is a %s." % (name, type(metric).__name__))
+
+    return metric
+
+
+def counter(name):
+    return _get(name, Counter)
+
+
+def gauge(name):
+    return _get(name, Gauge)
+
+
+def histogram(name):
+    return _get(name, Histogram)
+
+
+def snapshot():
+    with _lock:
+        metrics = dict(_metrics)
+
+    return dict((name, metric.snapshot()) for name, metric in metrics.iteritems())
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(snapshot(), sort_keys=True, indent=2)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format, *args)
+
+
+class StatusServer(object):
+    """
+    Serves a JSON snapshot of every metric over HTTP, from a daemon thread.
+    """
+
+    def __init__(self, port, host='127.0.0.1'):
+        self.__logger = logging.getLogger(__name__)
+
+        self._server = HTTPServer((host, port), _StatusHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        self.__logger.info("Status available at http://%s:%d/", *self._server.server_address)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
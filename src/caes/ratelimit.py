@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+
+from caes import metrics
+
+
+def check_rate(rate):
+    if rate is not None and rate <= 0:
+        raise ValueError("Rate must be positive, got %s." % rate)
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled at rate tokens per second, holding at most burst tokens
+    (one second worth by default). A rate of None means no limit; otherwise it must
+    be positive. Requests larger than the bucket still go through, leaving it in
+    debt.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self._lock = threading.Lock()
+        self._last = time.time()
+        self.set_rate(rate, burst)
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate, burst=None):
+        check_rate(rate)
+
+        with self._lock:
+            self._rate = rate
+            self._burst = burst if burst is not None else rate
+            self._tokens = self._burst
+
+    def acquire(self, n):
+        """
+        Takes n tokens, sleeping until they are available, and returns the time slept.
+        """
+        with self._lock:
+            if self._rate is None:
+                return 0
+
+            now = time.time()
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+
+            self._tokens -= n
+            wait = -self._tokens / float(self._rate) if self._tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+
+class RateLimiter(object):
+    """
+    Limits writes to docs_per_second and bytes_per_second, exporting the time spent
+    waiting as the counter <name>.throttled_seconds.
+    """
+
+    def __init__(self, name, docs_per_second=None, bytes_per_second=None):
+        self._docs = TokenBucket(docs_per_second)
+        self._bytes = TokenBucket(bytes_per_second)
+        self._throttled = metrics.counter('%s.throttled_seconds' % name)
+
+    @property
+    def limits_bytes(self):
+        return self._bytes.rate is not None
+
+    def set_rates(self, docs_per_second=None, bytes_per_second=None):
+        # Both checked first, so that a bad rate leaves the limits as they were.
+        check_rate(docs_per_second)
+        check_rate(bytes_per_second)
+
+        self._docs.set_rate(docs_per_second)
+        self._bytes.set_rate(bytes_per_second)
+
+    def throttle(self, docs, nbytes=0):
+        waited = self._docs.acquire(docs) + self._bytes.acquire(nbytes)
+        if waited > 0:
+            self._throttled.inc(waited)
+
+    def throttle_entries(self, entries):
+        """
+        Throttles the (data, did, ts) entries, measuring data as JSON only when there is
+        a bytes limit.
+        """
+        nbytes = 0
+        if self.limits_bytes:
+            nbytes = sum(len(json.dumps(data, default=unicode)) for data, _, _ in entries)
+
+        self.throttle(len(entries), nbytes)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+from itertools import izip
+
+# Column tuples seen so far, so that every document of a given shape shares one.
+# Emptied when it reaches MAX_SHAPES, so that ever changing shapes can't grow it
+# without bound; records made before keep their tuples.
+MAX_SHAPES = 10000
+_shapes = dict()
+
+
+def _intern(columns):
+    shape = _shapes.get(columns)
+    if shape is not None:
+        return shape
+
+    if len(_shapes) >= MAX_SHAPES:
+        _shapes.clear()
+
+    return _shapes.setdefault(columns, columns)
+
+
+class Record(object):
+    """
+    A document in flight between latest() and write(): its column names, shared by
+    every record of the same shape, its values, in the same order, and its did and ts.
+    It still unpacks and indexes like the (data, did, ts) tuples it replaces, data
+    being built on demand.
+    """
+
+    __slots__ = ('columns', 'values', 'did', 'ts')
+
+    def __init__(self, columns, values, did, ts):
+        self.columns = _intern(tuple(columns)) if columns is not None else None
+        self.values = tuple(values) if values is not None else None
+        self.did = did
+        self.ts = ts
+
+    @classmethod
+    def from_dict(cls, data, did, ts):
+        if data is None:
+            return cls(None, None, did, ts)
+
+        return cls(data.keys(), data.values(), did, ts)
+
+    @property
+    def has_data(self):
+        return self.columns is not None
+
+    @property
+    def data(self):
+        if self.columns is None:
+            return None
+
+        return dict(izip(self.columns, self.values))
+
+    def __len__(self):
+        return 3
+
+    def __iter__(self):
+        return iter((self.data, self.did, self.ts))
+
+    def __getitem__(self, i):
+        if i == 1 or i == -2:
+            return self.did
+        elif i == 2 or i == -1:
+            return self.ts
+
+        return (self.data, self.did, self.ts)[i]
+
+    def __eq__(self, other):
+        if not isinstance(other, Record) and not (isinstance(other, tuple) and len(other) == 3):
+            return NotImplemented
+
+        return tuple(self) == tuple(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Record(%r, %r, %r)" % tuple(self)
+
+    def __reduce__(self):
+        return Record, (self.columns, self.values, self.did, self.ts)
+
+
+def as_record(entry):
+    """
+    Returns entry as a Record, converting it if it is a (data, did, ts) tuple.
+    """
+    if isinstance(entry, Record):
+        return entry
+
+    return Record.from_dict(*entry)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import logging
+import os
+import threading
+import time
+import zlib
+
+from os.path import exists, dirname
+from caes.spill import write_record, read_records
+
+
+class Recorder(object):
+    """
+    Records sync traffic to the gzipped file at path: a ('cycle', since, time) record
+    at the start of each cycle, then ('latest', side, entries) for what each side's
+    latest() returned and ('write', side, entries) for what each side was asked to
+    write, in chunks of up to chunk_size entries. Recordings made across restarts
+    are appended to the same file.
+    """
+
+    def __init__(self, path, chunk_size=1000):
+        self.__logger = logging.getLogger(__name__)
+
+        if dirname(path) and not exists(dirname(path)):
+            os.makedirs(dirname(path))
+
+        self._lock = threading.Lock()
+        self._chunk_size = chunk_size
+        self._file = gzip.open(path, 'ab')
+
+        self.__logger.info("Recording sync traffic to %s", path)
+
+    def _write(self, record):
+        with self._lock:
+            write_record(self._file, record)
+
+    def cycle(self, since):
+        with self._lock:
+            self._file.flush()
+            write_record(self._file, ('cycle', since, time.time()))
+
+    def tap(self, kind, side, dlist):
+        """
+        Passes dlist through, recording its entries as kind for side.
+        """
+        chunk = []
+        for entry in dlist:
+            chunk.append(entry)
+            if len(chunk) >= self._chunk_size:
+                self._write((kind, side, chunk))
+                chunk = []
+
+            yield entry
+
+        if len(chunk) > 0:
+            self._write((kind, side, chunk))
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def iter_recording(path):
+    """
+    Yields the records of the recording at path, stopping at a truncated one.
+    """
+    f = gzip.open(path, 'rb')
+    try:
+        for record in read_records(f):
+            yield record
+    except (IOError, EOFError, zlib.error) as e:
+        logging.getLogger(__name__).warning("Recording %s ends early: %s", path, e)
+    finally:
+        f.close()
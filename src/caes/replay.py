@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import time
+
+from caes.metrics import Histogram
+from caes.record import as_record
+from caes.recording import iter_recording
+from caes.sync import Sync
+
+
+class MemoryClient(object):
+    """
+    Stand-in for a client, backed by a dict: iter_latest yields the entries fed to it
+    since the last call and write keeps the documents by did.
+    """
+
+    def __init__(self):
+        self._latest = []
+        self.docs = dict()
+        self.written = 0
+
+    def feed(self, entries):
+        self._latest.extend(entries)
+
+    def flush(self):
+        pass
+
+    def iter_latest(self, since):
+        latest, self._latest = self._latest, []
+        return iter(latest)
+
+    def latest(self, since):
+        return list(self.iter_latest(since))
+
+    def write(self, dlist):
+        for entry in dlist:
+            record = as_record(entry)
+            if record.has_data:
+                self.docs[record.did] = record
+                self.written += 1
+
+        return []
+
+    def close(self):
+        pass
+
+
+class Replayer(object):
+    """
+    Feeds the cycles recorded at path through Sync, with sync_kw, against
+    MemoryClients, and measures how long each cycle takes.
+    """
+
+    def __init__(self, path, **sync_kw):
+        self.__logger = logging.getLogger(__name__)
+
+        self._path = path
+        self._sync_kw = sync_kw
+        self._recorded_writes = 0
+
+    def _cycles(self):
+        """
+        Yields (since, latest) for each recorded cycle, latest holding what each side
+        returned. Recorded writes are only counted, as a pipelined recording may
+        have them after the next cycle started.
+        """
+        since = None
+        latest = None
+        for record in iter_recording(self._path):
+            if record[0] == 'cycle':
+                if latest is not None:
+                    yield since, latest
+                since, latest = record[1], dict(es=[], cassandra=[])
+            elif record[0] == 'latest' and latest is not None:
+                latest[record[1]].extend(record[2])
+            elif record[0] == 'write':
+                self._recorded_writes += sum(1 for entry in record[2] if as_record(entry).has_data)
+
+        if latest is not None:
+            yield since, latest
+
+    def run(self):
+        eclient = MemoryClient()
+        cclient = MemoryClient()
+        durations = Histogram()
+        cycles = 0
+        read = 0
+
+        start = time.time()
+        with Sync(eclient, cclient, **self._sync_kw) as sync:
+            for since, latest in self._cycles():
+                eclient.feed(latest['es'])
+                cclient.feed(latest['cassandra'])
+                read += len(latest['es']) + len(latest['cassandra'])
+
+                cycle_start = time.time()
+                sync.sync(since)
+                durations.observe(time.time() - cycle_start)
+                cycles += 1
+        elapsed = time.time() - start
+
+        written = eclient.written + cclient.written
+
+        return dict(cycles=cycles,
+                    read=read,
+                    written=written,
+                    recorded_writes=self._recorded_writes,
+                    seconds=elapsed,
+                    docs_per_second=written / elapsed if elapsed > 0 else 0,
+                    cycle_seconds=durations.snapshot())
+
+
+def replay():
+    parser = argparse.ArgumentParser(description="Replays sync traffic recorded with the record setting "
+                                                 "against in-memory stand-ins, and reports throughput and "
+                                                 "latency.")
+    parser.add_argument('path', help="The recording to replay.")
+    parser.add_argument('--concurrent', action='store_true',
+                        help="Run both sync directions side by side.")
+    parser.add_argument('--pipelined', action='store_true',
+                        help="Overlap each cycle's read with the previous cycle's write.")
+    parser.add_argument('--queue-size', type=int, default=10000,
+                        help="Documents kept in memory per direction before spilling.")
+    parser.add_argument('--spill-dir', default=None,
+                        help="Where spilled documents are kept.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    report = Replayer(args.path,
+                      concurrent=args.concurrent,
+                      pipelined=args.pipelined,
+                      queue_size=args.queue_size,
+                      spill_dir=args.spill_dir).run()
+
+    print "%d cycles, %d docs read, %d written (%d recorded) in %.2fs: %.0f docs/s" % (
+        report['cycles'], report['read'], report['written'], report['recorded_writes'],
+        report['seconds'], report['docs_per_second'])
+
+    cycle_seconds = report['cycle_seconds']
+    if cycle_seconds['count'] > 0:
+        print "Seconds per cycle: p50 %.4f, p90 %.4f, p99 %.4f, max %.4f" % (
+            cycle_seconds['p50'], cycle_seconds['p90'], cycle_seconds['p99'], cycle_seconds['max'])
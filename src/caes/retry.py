@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import random
+import threading
+import time
+
+from collections import deque
+from os.path import exists, dirname
+from caes.spill import write_record, iter_records
+
+
+class RetryLog(object):
+    """
+    Durable log of (data, did, ts) entries whose write failed. Entries are appended
+    to the file at path as they fail, and handed back by pop_due once their
+    exponential backoff (with jitter) has elapsed. Only the newest entry per did is
+    kept, and entries older than a fresh update of the same did are discarded.
+
+    Entries handed out stay in the log until the push that follows their pop_due
+    leaves them out of failed, so that a crash while they are being written again
+    loses none of them. Up to two pop_due can await their push, so that a cycle can
+    pop its retries while the previous one is still writing.
+    """
+
+    def __init__(self, path, base_delay=1, max_delay=600, max_attempts=10):
+        self.__logger = logging.getLogger(__name__)
+
+        self._path = path
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._max_attempts = max_attempts
+
+        self._lock = threading.Lock()
+        self._records = dict()
+        # The records handed out by each pop_due still awaiting its push, by (did, ts).
+        self._in_flight = deque()
+        self._dirty = False
+
+        if not exists(dirname(path)):
+            os.makedirs(dirname(path))
+
+        if exists(path):
+            with open(path, 'rb') as f:
+                buf = f.read()
+
+            offset = 0
+            for (entry, attempts, due), offset in iter_records(buf):
+                self._records[entry[1]] = (entry, attempts, due)
+
+            # Appending after a record torn by a crash would make the log unreadable.
+            if offset < len(buf):
+                self.__logger.warning("Dropping a truncated entry at the end of %s", path)
+                self._compact()
+
+            self.__logger.info("%d entries pending retry in %s", len(self._records), path)
+
+    def __len__(self):
+        return len(self._records)
+
+    def _delay(self, attempts):
+        delay = min(self._max_delay, self._base_delay * 2 ** (attempts - 1))
+        return delay / 2.0 + random.uniform(0, delay / 2.0)
+
+    def push(self, failed, now=None):
+        """
+        Appends the entries in failed to the log, scheduling each for its next attempt,
+        and forgets the ones handed out by the oldest pop_due awaiting a push that are
+        not in failed, as they were written.
+        """
+        with self._lock:
+            self._push(failed, time.time() if now is None else now)
+
+    def _forget(self, record):
+        did = record[0][1]
+        if self._records.get(did) is record:
+            del self._records[did]
+            self._dirty = True
+
+    def _push(self, failed, now):
+        written = self._in_flight.popleft() if len(self._in_flight) > 0 else dict()
+
+        appended = []
+        for entry in failed:
+            did, ts = entry[1], entry[2]
+            handed = [in_flight.pop((did, ts)) for in_flight in (written,) + tuple(self._in_flight)
+                      if (did, ts) in in_flight]
+            attempts = max([record[1] for record in handed] or [0]) + 1
+
+            if attempts > self._max_attempts:
+                self.__logger.error("Giving up on %s after %d attempts.", str(did), attempts - 1)
+                for record in handed:
+                    self._forget(record)
+                continue
+
+            current = self._records.get(did)
+            if current is not None and current[0][2] > ts:
+                continue
+
+            record = (entry, attempts, now + self._delay(attempts))
+            self._records[did] = record
+            appended.append(record)
+
+        for record in written.itervalues():
+            self._forget(record)
+
+        if self._dirty:
+            self._compact()
+        elif len(appended) > 0:
+            with open(self._path, 'ab') as f:
+                for record in appended:
+                    write_record(f, record)
+                f.flush()
+                os.fsync(f.fileno())
+
+        if len(appended) > 0:
+            self.__logger.warning("%d entries scheduled for retry.", len(appended))
+
+    def pop_due(self, now=None):
+        """
+        Returns the entries due for another attempt, leaving out the ones already
+        handed out. Past two pop_due awaiting their push, the entries of the oldest
+        are handed out again once due.
+        """
+        now = time.time() if now is None else now
+
+        with self._lock:
+            due = [r for r in self._records.itervalues()
+                   if r[2] <= now and not any((r[0][1], r[0][2]) in in_flight for in_flight in self._in_flight)]
+
+            self._in_flight.append(dict(((r[0][1], r[0][2]), r) for r in due))
+            if len(self._in_flight) > 2:
+                self._in_flight.popleft()
+
+        return [entry for entry, _, _ in due]
+
+    def supersede(self, dlist):
+        """
+        Passes dlist through, discarding pending entries older than the ones seen.
+        """
+        for entry in dlist:
+            with self._lock:
+                current = self._records.get(entry[1])
+                if current is not None and current[0][2] <= entry[2]:
+                    del self._records[entry[1]]
+                    self._dirty = True
+
+            yield entry
+
+    def _compact(self):
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for record in self._records.itervalues():
+                write_record(f, record)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.rename(tmp_path, self._path)
+        self._dirty = False
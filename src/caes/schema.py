@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+
+from caes.mapping import COERCIONS
+from caes.record import MAX_SHAPES, Record
+
+
+def _to_text(v):
+    if isinstance(v, basestring):
+        return v
+
+    return json.dumps(v, default=unicode) if isinstance(v, (dict, list)) else unicode(v)
+
+
+# Coercion for the values of each CQL type, by the driver's type name.
+CQL_COERCIONS = {
+    'int': int,
+    'bigint': long,
+    'varint': long,
+    'counter': long,
+    'float': float,
+    'double': float,
+    'ascii': _to_text,
+    'text': _to_text,
+    'varchar': _to_text,
+    'boolean': COERCIONS['bool'],
+    'uuid': COERCIONS['uuid'],
+    'timeuuid': COERCIONS['uuid']
+}
+
+
+class TableSchema(object):
+    """
+    Conforms records to the columns of table, the driver's TableMetadata: fields
+    with no matching column are left out, with a warning the first time, or written
+    as a JSON object to overflow_column if there is one, and values are coerced to
+    their column's type. The work needed for each record shape is worked out once.
+    """
+
+    def __init__(self, table, id_column, overflow_column=None):
+        self.__logger = logging.getLogger(__name__)
+
+        self.table = table
+        self._columns = dict((name, column.data_type.typename)
+                             for name, column in table.columns.iteritems()
+                             if name not in (id_column, overflow_column))
+
+        self._overflow_column = None
+        if overflow_column is not None:
+            if overflow_column in table.columns:
+                self._overflow_column = overflow_column
+            else:
+                self.__logger.warning("%s has no overflow column %s.", table.name, overflow_column)
+
+        self._plans = dict()
+        self._warned = set()
+
+    def _plan(self, columns):
+        """
+        Returns, for columns, the (index, column, coercion) of each field to write and
+        the indexes of the others.
+        """
+        plan = self._plans.get(columns)
+        if plan is not None:
+            return plan
+
+        kept = []
+        unknown = []
+        for i, field in enumerate(columns):
+            # Unquoted CQL names are case insensitive.
+            typename = self._columns.get(field.lower())
+            if typename is None:
+                unknown.append(i)
+                if field not in self._warned:
+                    self._warned.add(field)
+                    self.__logger.warning("%s is not a column of %s, %s.", field, self.table.name,
+                                          "writing it to %s" % self._overflow_column
+                                          if self._overflow_column is not None else "leaving it out")
+            else:
+                kept.append((i, typename, CQL_COERCIONS.get(typename)))
+
+        # Bounded like the shapes themselves.
+        if len(self._plans) >= MAX_SHAPES:
+            self._plans.clear()
+
+        plan = self._plans[columns] = (kept, unknown)
+        return plan
+
+    def conform(self, record):
+        if not record.has_data:
+            return record
+
+        kept, unknown = self._plan(record.columns)
+
+        names = []
+        values = []
+        left_out = list(unknown)
+        for i, typename, coerce in kept:
+            v = record.values[i]
+            if v is not None and coerce is not None:
+                try:
+                    v = coerce(v)
+                except (ValueError, TypeError):
+                    self.__logger.warning("Can't write %s of %s as %s.", record.columns[i], str(record.did), typename)
+                    left_out.append(i)
+                    continue
+
+            names.append(record.columns[i])
+            values.append(v)
+
+        if self._overflow_column is not None and len(left_out) > 0:
+            names.append(self._overflow_column)
+            values.append(json.dumps(dict((record.columns[i], record.values[i]) for i in left_out), default=unicode))
+
+        return Record(names, values, record.did, record.ts)
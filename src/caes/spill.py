@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+import cPickle
+import logging
+import mmap
+import os
+import struct
+import tempfile
+
+from collections import deque
+
+_HEADER = struct.Struct('>I')
+
+
+def write_record(f, obj):
+    payload = cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL)
+    f.write(_HEADER.pack(len(payload)))
+    f.write(payload)
+
+
+def iter_records(buf, offset=0):
+    """
+    Yields (record, next_offset) for each complete length-prefixed record in buf,
+    starting at offset. A truncated record at the end of buf is ignored.
+    """
+    end = len(buf)
+    while offset + _HEADER.size <= end:
+        size, = _HEADER.unpack_from(buf, offset)
+        start = offset + _HEADER.size
+        if start + size > end:
+            break
+
+        offset = start + size
+        yield cPickle.loads(buf[start:offset]), offset
+
+
+def read_records(f):
+    """
+    Yields each complete length-prefixed record read from the file object f, up to
+    a truncated one or the end of the file.
+    """
+    while True:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+
+        size, = _HEADER.unpack(header)
+        payload = f.read(size)
+        if len(payload) < size:
+            return
+
+        yield cPickle.loads(payload)
+
+
+class SpillQueue(object):
+    """
+    FIFO queue that keeps up to max_items in memory. Past that, items are appended
+    to a segment file in spill_dir and read back, in order, through mmap once the
+    in-memory ones are drained. The segment file is removed as soon as it is empty.
+    """
+
+    def __init__(self, max_items=10000, spill_dir=None):
+        self.__logger = logging.getLogger(__name__)
+
+        self._max_items = max_items
+        self._spill_dir = spill_dir
+        self._memory = deque()
+
+        self._segment = None
+        self._segment_path = None
+        self._map = None
+        self._offset = 0
+        self._spilled = 0
+
+    def __len__(self):
+        return len(self._memory) + self._spilled
+
+    def put(self, item):
+        if self._segment is None and len(self._memory) < self._max_items:
+            self._memory.append(item)
+            return
+
+        if self._segment is None:
+            fd, self._segment_path = tempfile.mkstemp(prefix='caes-', suffix='.seg', dir=self._spill_dir)
+            self._segment = os.fdopen(fd, 'w+b')
+            self.__logger.info("Queue over %d items, spilling to %s", self._max_items, self._segment_path)
+
+        write_record(self._segment, item)
+        self._spilled += 1
+
+    def get(self):
+        if len(self._memory) > 0:
+            return self._memory.popleft()
+
+        if self._spilled == 0:
+            raise IndexError("get from an empty queue")
+
+        if self._map is None or self._offset >= len(self._map):
+            self._remap()
+
+        item, self._offset = next(iter_records(self._map, self._offset))
+        self._spilled -= 1
+
+        if self._spilled == 0:
+            self.close()
+
+        return item
+
+    def drain(self):
+        while len(self) > 0:
+            yield self.get()
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+
+        self._segment.flush()
+        self._map = mmap.mmap(self._segment.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+
+        if self._segment is not None:
+            self._segment.close()
+            os.remove(self._segment_path)
+
+        self._segment = None
+        self._segment_path = None
+        self._map = None
+        self._offset = 0
+        self._spilled = 0
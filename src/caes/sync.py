@@ -3,36 +3,275 @@
 
 import time
 import logging
+import signal
 import yaml
 
+from itertools import chain
+from multiprocessing.pool import ThreadPool
+
 from logging.config import dictConfig
 from daemon import runner
 from os.path import exists, expanduser, join
 from os import getcwd
-from caes.client import CassandraClient, ElasticSearchClient
+from caes import metrics
+from caes.fingerprint import fingerprint, FingerprintCache
+from caes.mapping import reverse
+from caes.record import as_record
+from caes.recording import Recorder
+from caes.retry import RetryLog
+from caes.spill import SpillQueue
 
 
 class Sync(object):
-    def __init__(self, eclient, cclient):
+    def __init__(self, eclient, cclient, queue_size=10000, spill_dir=None, retry_dir=None, concurrent=False,
+                 pipelined=False, record_path=None, fingerprint_cache_size=None, fingerprint_dir=None):
         self.__logger = logging.getLogger(__name__)
         self._eclient = eclient
         self._cclient = cclient
+        self._queue_size = queue_size
+        self._spill_dir = spill_dir
+
+        # Reads and writes get a pool each, so that a pipelined write keeps neither
+        # direction of the next read waiting for a thread.
+        self._pool = ThreadPool(2) if concurrent else None
+        self._write_pool = ThreadPool(2) if concurrent else None
+
+        # Writes the previous cycle in the background while the next one reads.
+        self._writer = ThreadPool(1) if pipelined else None
+        self._writing = None
+
+        self._eretry = None
+        self._cretry = None
+        if retry_dir is not None:
+            self._eretry = RetryLog(join(retry_dir, 'es-to-cassandra.log'))
+            self._cretry = RetryLog(join(retry_dir, 'cassandra-to-es.log'))
+
+        self._recorder = Recorder(record_path) if record_path is not None else None
+
+        self._fingerprints = None
+        if fingerprint_cache_size is not None:
+            self._fingerprints = dict()
+            for direction in ('es_to_cassandra', 'cassandra_to_es'):
+                path = None
+                if fingerprint_dir is not None:
+                    path = join(fingerprint_dir, direction.replace('_', '-') + '.fp')
+                self._fingerprints[direction] = FingerprintCache(fingerprint_cache_size, path)
+
+    def _enqueue(self, dlist):
+        """
+        Buffers dlist in a SpillQueue and returns a generator draining it, which
+        yields only the entry with the highest timestamp for each did. Only the
+        entries themselves spill: the index of the newest timestamp of each did
+        stays in memory for the whole cycle.
+        """
+        queue = SpillQueue(self._queue_size, self._spill_dir)
+        newest = dict()
+        for entry in dlist:
+            entry = as_record(entry)
+            did, ts = entry.did, entry.ts
+            if did not in newest or ts > newest[did]:
+                newest[did] = ts
+            queue.put(entry)
+
+        def drain():
+            try:
+                for entry in queue.drain():
+                    did, ts = entry.did, entry.ts
+                    if newest.get(did) == ts:
+                        del newest[did]
+                        yield entry
+            finally:
+                queue.close()
+
+        return drain()
+
+    def _latest(self, client, retry, since):
+        """
+        Merges the entries due for retry with the latest ones from client, so that a
+        retry is dropped whenever a newer version of the same did shows up.
+        """
+        latest = self._tap('latest', client, client.iter_latest(since))
+        if retry is None:
+            return self._enqueue(latest)
+
+        return self._enqueue(chain(retry.supersede(latest), retry.pop_due()))
+
+    def _write(self, client, retry, dlist, direction):
+        written = []
+
+        def track(dlist):
+            for entry in dlist:
+                if entry.has_data:
+                    written.append((entry.did, entry.ts))
+                yield entry
+
+        if self._fingerprints is not None:
+            changed = dict()
+            dlist = self._skip_unchanged(dlist, direction, changed)
+
+        failed = client.write(track(self._tap('write', client, dlist)))
+        if retry is not None:
+            retry.push(failed)
+
+        if self._fingerprints is not None:
+            for entry in failed:
+                changed.pop(entry[1], None)
+            fingerprints = self._fingerprints[direction]
+            for did, fp in changed.iteritems():
+                fingerprints.set(did, fp)
+
+        self._record_lag(direction, written, failed)
+
+    def _skip_unchanged(self, dlist, direction, changed):
+        """
+        Passes dlist through, leaving out the entries whose payload is the same as the
+        last one synced in direction and putting the fingerprints of the others in
+        changed. Each did seen is forgotten by the other direction's cache, as the
+        destination's copy it fingerprinted is being replaced.
+        """
+        fingerprints = self._fingerprints[direction]
+        other = [cache for name, cache in self._fingerprints.iteritems() if name != direction][0]
+        skipped = metrics.counter('skipped.%s' % direction)
+
+        for entry in dlist:
+            if entry.has_data:
+                other.discard(entry.did)
+
+                fp = fingerprint(entry.data)
+                if fingerprints.get(entry.did) == fp:
+                    self.__logger.debug("%s is unchanged, skipping.", str(entry.did))
+                    skipped.inc()
+                    continue
+
+                changed[entry.did] = fp
+
+            yield entry
+
+    def _tap(self, kind, client, dlist):
+        if self._recorder is None:
+            return dlist
+
+        return self._recorder.tap(kind, 'es' if client is self._eclient else 'cassandra', dlist)
+
+    def _record_lag(self, direction, written, failed):
+        """
+        Records, for each document written, the delay between its source timestamp
+        and now, when it has just been written to the destination.
+        """
+        now = time.time()
+        failed = set((entry[1], entry[2]) for entry in failed)
+
+        lag = metrics.histogram('lag.%s' % direction)
+        cycle_max = 0
+        for did, ts in written:
+            if (did, ts) in failed:
+                continue
+
+            delay = now - ts
+            lag.observe(delay)
+            cycle_max = max(cycle_max, delay)
+
+        metrics.gauge('lag.%s.max' % direction).set(cycle_max)
+
+        self.__logger.info("Synced %d docs %s, max lag %.1fs (%s)",
+                           len(written) - len(failed), direction.replace('_', ' '), cycle_max, lag.snapshot())
+
+    def read(self, since):
+        """
+        Reads the entries changed since since on both sides, buffered until written,
+        and returns them as (from ES, from Cassandra).
+        """
+        self._eclient.flush()
+        self._cclient.flush()
+
+        if self._pool is None:
+            elatest = self._latest(self._eclient, self._eretry, since)
+            clatest = self._latest(self._cclient, self._cretry, since)
+            return elatest, clatest
+
+        ereading = self._pool.apply_async(self._latest, (self._eclient, self._eretry, since))
+        creading = self._pool.apply_async(self._latest, (self._cclient, self._cretry, since))
+        return ereading.get(), creading.get()
+
+    def write(self, latest):
+        """
+        Writes the entries returned by read to the other side.
+        """
+        elatest, clatest = latest
+
+        if self._write_pool is None:
+            self._write(self._cclient, self._eretry, elatest, 'es_to_cassandra')
+            self._write(self._eclient, self._cretry, clatest, 'cassandra_to_es')
+            return
+
+        cwriting = self._write_pool.apply_async(self._write, (self._cclient, self._eretry, elatest, 'es_to_cassandra'))
+        ewriting = self._write_pool.apply_async(self._write, (self._eclient, self._cretry, clatest, 'cassandra_to_es'))
+        cwriting.get()
+        ewriting.get()
 
     def sync(self, since):
+        """
+        Reads and writes a cycle. When pipelined, the cycle is only read here, while
+        the previous one finishes writing, and then written in the background.
+        """
         self.__logger.info("Syncing since %d", since)
 
-        self._eclient.flush()
-        self._cclient.flush()
-        elatest = self._eclient.latest(since)
-        clatest = self._cclient.latest(since)
+        if self._recorder is not None:
+            self._recorder.cycle(since)
+
+        latest = self.read(since)
+
+        if self._writer is None:
+            self.write(latest)
+            return
+
+        self.wait()
+        self._writing = self._writer.apply_async(self.write, (latest,))
+
+    def wait(self):
+        """
+        Waits for the cycle being written in the background, if any.
+        """
+        writing, self._writing = self._writing, None
+        if writing is not None:
+            writing.get()
 
-        self._cclient.write(e for e in elatest)
-        self._eclient.write(c for c in clatest)
+    def replace_clients(self, eclient, cclient):
+        """
+        Syncs with eclient and cclient from the next cycle on. A client replacing
+        another takes over its echo filter, so that what the old one just wrote is
+        still not synced back.
+        """
+        self.wait()
+
+        for old, new in ((self._eclient, eclient), (self._cclient, cclient)):
+            if new is not old:
+                new.echo_filter = old.echo_filter
+
+        self._eclient = eclient
+        self._cclient = cclient
 
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, tb):
+        if self._writer is not None:
+            self.wait()
+            self._writer.close()
+            self._writer.join()
+
+        for pool in (self._pool, self._write_pool):
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if self._recorder is not None:
+            self._recorder.close()
+
+        if self._fingerprints is not None:
+            for fingerprints in self._fingerprints.itervalues():
+                fingerprints.save()
+
         self._eclient.close()
         self._cclient.close()
 
@@ -47,7 +286,10 @@ class App(object):
         self.pidfile_path = '/tmp/caes.pid'
         self.pidfile_timeout = 5
 
-    def _config(self):
+        self._status_port = None
+        self._reload_requested = False
+
+    def _load(self):
         config_dict = None
 
         if exists(expanduser("~/.caes/config.yaml")):
@@ -60,43 +302,209 @@ class App(object):
         with open(config_path) as f:
             config_dict = yaml.load(f)
 
-        logging.config.dictConfig(config_dict['logging'])
+        return config_dict
 
+    def _settings(self, config_dict):
+        """
+        Returns the interval, the ElasticSearchClient and CassandraClient kwargs and
+        the Sync kwargs set by config_dict.
+        """
         interval = config_dict.get('interval') if config_dict.get('interval') is not None else 10
 
+        concurrency = config_dict.get('concurrency') if config_dict.get('concurrency') is not None else 1
+
         es_config_dict = config_dict['ElasticSearchConfig']
-        eclient = self._config_es(es_config_dict)
+        es_kw = self._config_es(es_config_dict, concurrency)
 
         cassandra_config_dict = config_dict['CassandraConfig']
-        cclient = self._config_cassandra(cassandra_config_dict)
+        if cassandra_config_dict.get('mapping') is None:
+            cassandra_config_dict['mapping'] = reverse(es_config_dict.get('mapping'))
+
+        cassandra_kw = self._config_cassandra(cassandra_config_dict, concurrency)
+
+        sync_kw = self._config_sync(config_dict)
+
+        return interval, es_kw, cassandra_kw, sync_kw
+
+    def _config(self):
+        config_dict = self._load()
+
+        logging.config.dictConfig(config_dict['logging'])
+
+        interval, es_kw, cassandra_kw, sync_kw = self._settings(config_dict)
+
+        # Imported here so that caes.sync, and the replay tool built on it, can be
+        # imported without the drivers installed.
+        from caes.client import CassandraClient, ElasticSearchClient
+
+        eclient = ElasticSearchClient(**es_kw)
+        cclient = CassandraClient(**cassandra_kw)
+
+        self._es_kw = es_kw
+        self._cassandra_kw = cassandra_kw
+        self._sync_kw = sync_kw
+        self._status_port = config_dict.get('statusPort')
+
+        return eclient, cclient, interval, sync_kw
+
+    def reload(self, signum=None, frame=None):
+        """
+        SIGHUP handler: the config file is read again before the next cycle.
+        """
+        self._reload_requested = True
 
-        return eclient, cclient, interval
+    def _reconfigurable(self, cls, kw):
+        return dict((k, v) for k, v in kw.iteritems() if k in cls.RECONFIGURABLE)
 
-    def _config_es(self, es_config_dict):
+    def _replacement(self, client, cls, old_kw, new_kw):
+        """
+        Returns a new client with the settings in new_kw if any that client can't
+        change while connected differ from old_kw. Otherwise, checks that client can
+        take them and returns None.
+        """
+        def cold(kw):
+            return dict((k, v) for k, v in kw.iteritems() if k not in cls.RECONFIGURABLE)
+
+        if cold(old_kw) != cold(new_kw):
+            self.__logger.info("%s settings changed, reconnecting.", cls.__name__)
+            return cls(**new_kw)
+
+        client.reconfigure(dry_run=True, **self._reconfigurable(cls, new_kw))
+        return None
+
+    def _reload(self, sync, eclient, cclient, interval):
+        """
+        Applies the changes to the config file between two cycles, keeping the clients,
+        and their warm connections, unless their connection settings changed. Returns
+        the clients and the interval to use from now on.
+        """
+        self._reload_requested = False
+
+        self.__logger.info("Reloading config.")
+
+        # Whatever can fail, down to building the new clients, is done before anything
+        # changes, so that a bad config leaves the running settings as they are.
+        replacements = []
+        try:
+            config_dict = self._load()
+            new_interval, es_kw, cassandra_kw, sync_kw = self._settings(config_dict)
+
+            from caes.client import CassandraClient, ElasticSearchClient
+
+            for client, cls, old_kw, new_kw in ((eclient, ElasticSearchClient, self._es_kw, es_kw),
+                                                (cclient, CassandraClient, self._cassandra_kw, cassandra_kw)):
+                replacements.append(self._replacement(client, cls, old_kw, new_kw))
+
+            logging.config.dictConfig(config_dict['logging'])
+        except Exception as e:
+            self.__logger.exception(e)
+            for new in replacements:
+                if new is not None:
+                    new.close()
+            return eclient, cclient, interval
+
+        new_eclient, new_cclient = replacements
+
+        # The cycle still being written keeps the settings it started with.
+        sync.wait()
+
+        if new_eclient is None:
+            new_eclient = eclient
+            eclient.reconfigure(**self._reconfigurable(ElasticSearchClient, es_kw))
+        if new_cclient is None:
+            new_cclient = cclient
+            cclient.reconfigure(**self._reconfigurable(CassandraClient, cassandra_kw))
+
+        if new_eclient is not eclient or new_cclient is not cclient:
+            sync.replace_clients(new_eclient, new_cclient)
+            for old, new in ((eclient, new_eclient), (cclient, new_cclient)):
+                if new is not old:
+                    old.close()
+
+        for k in set(sync_kw) | set(self._sync_kw):
+            if sync_kw.get(k) != self._sync_kw.get(k):
+                self.__logger.warning("Restart to apply the change to %s.", k)
+
+        if config_dict.get('statusPort') != self._status_port:
+            self.__logger.warning("Restart to apply the change to statusPort.")
+
+        self._es_kw = es_kw
+        self._cassandra_kw = cassandra_kw
+
+        return new_eclient, new_cclient, new_interval
+
+    def _config_sync(self, config_dict):
+        sync_kw = dict()
+        if config_dict.get('concurrency') is not None:
+            sync_kw['concurrent'] = config_dict['concurrency'] > 1
+        if config_dict.get('pipelined') is not None:
+            sync_kw['pipelined'] = config_dict['pipelined']
+
+        if config_dict.get('queueSize') is not None:
+            sync_kw['queue_size'] = config_dict['queueSize']
+
+        if config_dict.get('spillDir') is not None:
+            sync_kw['spill_dir'] = expanduser(config_dict['spillDir'])
+
+        if config_dict.get('fingerprintCacheSize') is not None:
+            sync_kw['fingerprint_cache_size'] = config_dict['fingerprintCacheSize']
+
+        if config_dict.get('fingerprintDir') is not None:
+            sync_kw['fingerprint_dir'] = expanduser(config_dict['fingerprintDir'])
+
+        if config_dict.get('record') is not None:
+            sync_kw['record_path'] = expanduser(config_dict['record'])
+
+        if config_dict.get('retryDir') is not None:
+            sync_kw['retry_dir'] = expanduser(config_dict['retryDir'])
+        else:
+            sync_kw['retry_dir'] = expanduser("~/.caes/retry")
+
+        return sync_kw
+
+    def _config_es(self, es_config_dict, concurrency=1):
         index = es_config_dict['index']
         doc_type = es_config_dict['type']
 
         driver = es_config_dict['driver'] if es_config_dict.get('driver') is not None else dict()
 
-        eskw = dict()
+        eskw = dict(concurrency=concurrency)
         if es_config_dict.get('exclude') is not None:
             eskw['exclude'] = es_config_dict['exclude']
 
         if es_config_dict.get('include') is not None:
             eskw['include'] = es_config_dict['include']
 
-        return ElasticSearchClient(index,
-                                   doc_type,
-                                   es_driver_params=driver,
-                                   **eskw)
+        if es_config_dict.get('mapping') is not None:
+            eskw['mapping'] = es_config_dict['mapping']
+
+        if es_config_dict.get('profile') is not None:
+            eskw['profile'] = es_config_dict['profile']
+
+        if es_config_dict.get('targetLatency') is not None:
+            eskw['target_latency'] = es_config_dict['targetLatency']
+
+        if es_config_dict.get('maxDocsPerSecond') is not None:
+            eskw['max_docs_per_second'] = es_config_dict['maxDocsPerSecond']
+
+        if es_config_dict.get('maxBytesPerSecond') is not None:
+            eskw['max_bytes_per_second'] = es_config_dict['maxBytesPerSecond']
 
-    def _config_cassandra(self, cassandra_config_dict):
+        if es_config_dict.get('slices') is not None:
+            eskw['slices'] = es_config_dict['slices']
+
+        return dict(index=index,
+                    doc_type=doc_type,
+                    es_driver_params=driver,
+                    **eskw)
+
+    def _config_cassandra(self, cassandra_config_dict, concurrency=1):
         keyspace = cassandra_config_dict['keyspace']
         data_column_family = cassandra_config_dict['dataColumnFamily']
         driver = cassandra_config_dict['driver'] if cassandra_config_dict.get('driver') is not None else dict()
         insert_query = cassandra_config_dict['insertQuery'] if cassandra_config_dict.get('insertQuery') is not None else ""
 
-        casskw = dict()
+        casskw = dict(concurrency=concurrency)
         if cassandra_config_dict.get('timeseriesColumnFamily') is not None:
             casskw['timeseries_column_family'] = cassandra_config_dict['timeseriesColumnFamily']
 
@@ -112,23 +520,55 @@ class App(object):
         if cassandra_config_dict.get('ttl') is not None:
             casskw['ttl'] = cassandra_config_dict['ttl']
 
-        return CassandraClient(keyspace,
-                               data_column_family,
-                               insert_query=insert_query,
-                               cassandra_driver_params=driver,
-                               **casskw)
+        if cassandra_config_dict.get('batchPolicy') is not None:
+            casskw['batch_policy'] = cassandra_config_dict['batchPolicy']
+
+        if cassandra_config_dict.get('batchSize') is not None:
+            casskw['batch_size'] = cassandra_config_dict['batchSize']
+
+        if cassandra_config_dict.get('mapping') is not None:
+            casskw['mapping'] = cassandra_config_dict['mapping']
+
+        if cassandra_config_dict.get('profile') is not None:
+            casskw['profile'] = cassandra_config_dict['profile']
+
+        if cassandra_config_dict.get('maxBatchSize') is not None:
+            casskw['max_batch_size'] = cassandra_config_dict['maxBatchSize']
+
+        if cassandra_config_dict.get('targetLatency') is not None:
+            casskw['target_latency'] = cassandra_config_dict['targetLatency']
+
+        if cassandra_config_dict.get('maxDocsPerSecond') is not None:
+            casskw['max_docs_per_second'] = cassandra_config_dict['maxDocsPerSecond']
+
+        if cassandra_config_dict.get('maxBytesPerSecond') is not None:
+            casskw['max_bytes_per_second'] = cassandra_config_dict['maxBytesPerSecond']
+
+        if cassandra_config_dict.get('overflowColumn') is not None:
+            casskw['overflow_column'] = cassandra_config_dict['overflowColumn']
+
+        return dict(keyspace=keyspace,
+                    data_column_family=data_column_family,
+                    insert_query=insert_query,
+                    cassandra_driver_params=driver,
+                    **casskw)
 
     def run(self):
-        eclient, cclient, interval = self._config()
+        eclient, cclient, interval, sync_kw = self._config()
+
+        if self._status_port is not None:
+            metrics.StatusServer(self._status_port).start()
 
         last = int(time.time())
 
         print "Syncing starting from %d" % last
 
-        with Sync(eclient, cclient) as s:
+        with Sync(eclient, cclient, **sync_kw) as s:
             while True:
                 new_last = int(time.time())
                 time.sleep(interval)
+                if self._reload_requested:
+                    eclient, cclient, interval = self._reload(s, eclient, cclient, interval)
                 s.sync(last)
                 last = new_last
 
@@ -136,4 +576,5 @@ class App(object):
 def sync():
     app = App()
     daemon_runner = runner.DaemonRunner(app)
+    daemon_runner.daemon_context.signal_map[signal.SIGHUP] = app.reload
     daemon_runner.do_action()
\ No newline at end of file
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from caes import metrics
+from caes.aimd import AIMD
+
+
+class AIMDTestCase(unittest.TestCase):
+    def setUp(self):
+        self.aimd = AIMD('test.batch_size', 10, minimum=2, maximum=20, increase=5, target_latency=1.0)
+
+    def test_additive_increase(self):
+        self.aimd.success(0.5)
+        self.assertEqual(15, self.aimd.size)
+
+        self.aimd.success(0.5)
+        self.aimd.success(0.5)
+        self.assertEqual(20, self.aimd.size)
+
+    def test_slow_holds(self):
+        self.aimd.success(2.0)
+        self.assertEqual(10, self.aimd.size)
+
+    def test_multiplicative_decrease(self):
+        self.aimd.failure()
+        self.assertEqual(5, self.aimd.size)
+
+        self.aimd.success(0.5, errors=1, total=5)
+        self.assertEqual(2, self.aimd.size)
+
+        self.aimd.failure()
+        self.assertEqual(2, self.aimd.size)
+
+    def test_gauge(self):
+        self.aimd.success(0.5)
+        self.assertEqual(15, metrics.snapshot()['test.batch_size'])
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(AIMDTestCase)
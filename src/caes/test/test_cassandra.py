@@ -100,6 +100,54 @@ class CassandraClientTestCase(unittest.TestCase):
         self.assertNotEqual(0, len(results))
         self.assertDictContainsSubset(data, results[0])
 
+    def test_write_doc_unknown_field(self):
+        data = dict(vint="1", vstring="Hi", unknown="dropped")
+        did = uuid4()
+        timestamp = int(time.time())
+
+        self.assertEqual([], self.cclient.write([(data, did, timestamp)]))
+
+        query = """
+            SELECT *
+            FROM %s
+            WHERE did = ?
+        """ % self.data_column_family
+
+        session = self.cclient._cluster.connect(self.keyspace)
+        session.row_factory = dict_factory
+        prepared = session.prepare(query)
+        results = session.execute(prepared, (did,))
+        session.shutdown()
+
+        self.assertNotEqual(0, len(results))
+        self.assertDictContainsSubset(dict(vint=1, vstring="Hi"), results[0])
+
+    def test_write_doc_unlogged(self):
+        cclient = CassandraClient(self.keyspace, self.data_column_family, batch_policy='unlogged', batch_size=2)
+
+        docs = [(dict(vint=i, vstring=str(i)), uuid4(), int(time.time())) for i in range(5)]
+        cclient.write(docs)
+        cclient.close()
+
+        self.cclient.flush()
+
+        query = """
+            SELECT *
+            FROM %s
+            WHERE did = ?
+        """ % self.data_column_family
+
+        session = self.cclient._cluster.connect(self.keyspace)
+        session.row_factory = dict_factory
+        prepared = session.prepare(query)
+
+        for data, did, _ in docs:
+            results = session.execute(prepared, (did,))
+            self.assertNotEqual(0, len(results))
+            self.assertDictContainsSubset(data, results[0])
+
+        session.shutdown()
+
     def test_write_doc_none(self):
         did = uuid4()
         timestamp = int(time.time())
@@ -153,6 +201,49 @@ class CassandraClientTestCase(unittest.TestCase):
         self.assertEqual(data.get('vint'), results[0].get('vint'))
         self.assertEqual(did, results[0].get('did'))
 
+    def test_extra_insert_query_unknown_field(self):
+        data = dict(vstring="Hi", vother=7)
+        did = uuid4()
+        timestamp = int(time.time())
+
+        self.cclient._insert_query = """
+                                        INSERT INTO vint_by_did (did, vint)
+                                        VALUES (%(did)s, %(vother)s)
+                                     """
+
+        self.assertEqual([], self.cclient.write([(data, did, timestamp)]))
+
+        self.cclient.flush()
+
+        query = """
+            SELECT *
+            FROM vint_by_did
+            WHERE did = ?
+        """
+
+        session = self.cclient._cluster.connect(self.keyspace)
+        session.row_factory = dict_factory
+        prepared = session.prepare(query)
+        results = session.execute(prepared, (did,))
+        session.shutdown()
+
+        self.assertEqual(1, len(results))
+        self.assertEqual(7, results[0].get('vint'))
+
+    def test_extra_insert_query_missing_field(self):
+        data = dict(vstring="Hi")
+        did = uuid4()
+        timestamp = int(time.time())
+
+        self.cclient._insert_query = """
+                                        INSERT INTO vint_by_did (did, vint)
+                                        VALUES (%(did)s, %(vint)s)
+                                     """
+
+        failed = self.cclient.write([(data, did, timestamp)])
+
+        self.assertEqual([did], [entry.did for entry in failed])
+
     def test_latest(self):
         session = self.cclient._cluster.connect(self.keyspace)
 
@@ -230,6 +321,33 @@ class CassandraClientTestCase(unittest.TestCase):
 
         session.shutdown()
 
+    def test_latest_coalesced(self):
+        session = self.cclient._cluster.connect(self.keyspace)
+
+        query = """
+            INSERT INTO %s (%s, %s, %s) VALUES (?, ?, ?)
+        """ % (self.cclient._timeseries_column_family,
+               self.cclient._timeseries_id_field_name,
+               self.cclient._timestamp_field_name,
+               self.cclient._data_id_field_name)
+
+        prepared = session.prepare(query)
+
+        did = uuid4()
+        t = int(time.time())
+        for i in range(5):
+            session.execute(prepared, (0, t + i, did))
+
+        session.shutdown()
+
+        self.cclient.flush()
+
+        results = self.cclient.latest(t)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(did, results[0][1])
+        self.assertEqual(t + 4, results[0][2])
+
 
 def test_suite():
     return unittest.TestLoader().loadTestsFromTestCase(CassandraClientTestCase)
\ No newline at end of file
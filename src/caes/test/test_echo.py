@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from uuid import uuid4
+from caes.echo import EchoFilter
+
+
+class EchoFilterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.echoes = EchoFilter(generations=2)
+        self.did = uuid4()
+
+    def test_add(self):
+        self.echoes.add(self.did, 10)
+
+        self.assertIn((self.did, 10), self.echoes)
+        self.assertNotIn((self.did, 11), self.echoes)
+
+    def test_discard(self):
+        self.echoes.add(self.did, 10)
+        self.echoes.rotate()
+        self.echoes.discard(self.did, 10)
+
+        self.assertNotIn((self.did, 10), self.echoes)
+
+    def test_rotate(self):
+        self.echoes.add(self.did, 10)
+        self.echoes.rotate()
+
+        self.assertIn((self.did, 10), self.echoes)
+
+        self.echoes.rotate()
+
+        self.assertNotIn((self.did, 10), self.echoes)
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(EchoFilterTestCase)
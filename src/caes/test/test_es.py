@@ -125,6 +125,29 @@ class ElasticSearchClientTestCase(unittest.TestCase):
         self.assertIn(did2, [did for _, did, _ in results2])
         self.assertEqual(len(results3), 0)
 
+    def test_latest_sliced(self):
+        eclient = ElasticSearchClient(self.index, self.doc_type, slices=4)
+
+        since = int(time.time()) - 40
+        docs = dict()
+        for i in range(40):
+            did = uuid4()
+            docs[did] = dict(f1=i, f2="Hi")
+            self.eclient._es.index(self.index,
+                                   self.doc_type,
+                                   docs[did], did,
+                                   timestamp=since + i,
+                                   version=since + i,
+                                   version_type="external")
+
+        self.eclient.flush()
+
+        results = eclient.latest(since)
+        eclient.close()
+
+        self.assertEqual(40, len(results))
+        self.assertEqual(docs, dict((did, data) for data, did, _ in results))
+
 
 def test_suite():
     return unittest.TestLoader().loadTestsFromTestCase(ElasticSearchClientTestCase)
\ No newline at end of file
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+
+from os.path import join
+from uuid import uuid4
+from caes.fingerprint import fingerprint, FingerprintCache
+
+
+class FingerprintCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.path = join(self.cache_dir, 'es-to-cassandra.fp')
+        self.cache = FingerprintCache(max_items=3, path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_get(self):
+        did = uuid4()
+        self.cache.set(did, fingerprint(dict(vint=1)))
+
+        self.assertEqual(fingerprint(dict(vint=1)), self.cache.get(did))
+        self.assertIsNone(self.cache.get(uuid4()))
+
+        self.cache.discard(did)
+
+        self.assertIsNone(self.cache.get(did))
+
+    def test_evicts_least_recent(self):
+        dids = [uuid4() for _ in range(4)]
+        for did in dids[:3]:
+            self.cache.set(did, 'fp')
+        self.cache.get(dids[0])
+        self.cache.set(dids[3], 'fp')
+
+        self.assertEqual(3, len(self.cache))
+        self.assertIsNone(self.cache.get(dids[1]))
+        self.assertEqual('fp', self.cache.get(dids[0]))
+
+    def test_save(self):
+        dids = [uuid4() for _ in range(3)]
+        for i, did in enumerate(dids):
+            self.cache.set(did, str(i))
+        self.cache.save()
+
+        cache = FingerprintCache(max_items=2, path=self.path)
+
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(dids[0]))
+        self.assertEqual('2', cache.get(dids[2]))
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(FingerprintCacheTestCase)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from uuid import uuid4
+from caes.mapping import Mapping, reverse
+
+
+def full_name(data):
+    return data['first'] + ' ' + data['last']
+
+
+class MappingTestCase(unittest.TestCase):
+    def test_identity(self):
+        data = dict(f1=1, f2="Hi")
+        self.assertIs(data, Mapping()(data))
+
+    def test_include_exclude(self):
+        data = dict(f1=1, f2="Hi", exclude1="blah")
+
+        self.assertDictEqual(dict(f1=1), Mapping(include=['f1'], exclude=['f1'])(data))
+        self.assertDictEqual(dict(f1=1, f2="Hi"), Mapping(exclude=['exclude1'])(data))
+
+    def test_rename_and_drop(self):
+        mapping = Mapping([dict(field='user', rename='user_name'), dict(field='debug', drop=True)])
+
+        self.assertDictEqual(dict(user_name='jg', vint=1), mapping(dict(user='jg', vint=1, debug=True)))
+
+    def test_coercion(self):
+        did = uuid4()
+        mapping = Mapping([dict(field='vint', type='int'),
+                           dict(field='flag', type='bool'),
+                           dict(field='ref', type='uuid'),
+                           dict(field='tags', type='json')])
+
+        result = mapping(dict(vint="12", flag="true", ref=str(did), tags=['a']))
+
+        self.assertDictEqual(dict(vint=12, flag=True, ref=did, tags='["a"]'), result)
+
+    def test_coercion_failure_drops_field(self):
+        mapping = Mapping([dict(field='vint', type='int')])
+
+        self.assertDictEqual(dict(vstring="Hi"), mapping(dict(vint="Hi", vstring="Hi")))
+
+    def test_derived(self):
+        mapping = Mapping([dict(field='name', format='%(first)s %(last)s'),
+                           dict(field='full', function='caes.test.test_mapping:full_name'),
+                           dict(field='length', format='%(first)s', type='int')])
+
+        result = mapping(dict(first='1', last='2'))
+
+        self.assertEqual('1 2', result['name'])
+        self.assertEqual('1 2', result['full'])
+        self.assertEqual(1, result['length'])
+
+    def test_reverse(self):
+        rules = [dict(field='user', rename='user_name'), dict(field='vint', type='int')]
+        mapping = Mapping(reverse(rules))
+
+        self.assertDictEqual(dict(user='jg', vint=1), mapping(dict(user_name='jg', vint=1)))
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(MappingTestCase)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+import urllib2
+
+from caes import metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_same_metric_by_name(self):
+        self.assertIs(metrics.counter('test.same'), metrics.counter('test.same'))
+        self.assertRaises(ValueError, metrics.gauge, 'test.same')
+
+    def test_histogram(self):
+        histogram = metrics.histogram('test.histogram')
+        for i in range(1, 101):
+            histogram.observe(i)
+
+        snapshot = histogram.snapshot()
+
+        self.assertEqual(100, snapshot['count'])
+        self.assertEqual(51, snapshot['p50'])
+        self.assertEqual(100, snapshot['max'])
+
+    def test_status_server(self):
+        metrics.gauge('test.status').set(42)
+
+        server = metrics.StatusServer(0)
+        server.start()
+        try:
+            response = urllib2.urlopen('http://127.0.0.1:%d/' % server._server.server_address[1])
+            status = json.load(response)
+        finally:
+            server.close()
+
+        self.assertEqual(42, status['test.status'])
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(MetricsTestCase)
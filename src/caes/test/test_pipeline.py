@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+
+from uuid import uuid4
+from caes.record import Record
+from caes.replay import MemoryClient
+from caes.sync import Sync
+
+
+class SlowClient(MemoryClient):
+    """
+    MemoryClient noting when each read starts and each write starts and ends, writes
+    taking a while.
+    """
+
+    def __init__(self):
+        super(SlowClient, self).__init__()
+        self.reads = []
+        self.writes = []
+
+    def iter_latest(self, since):
+        self.reads.append(time.time())
+        return super(SlowClient, self).iter_latest(since)
+
+    def write(self, dlist):
+        start = time.time()
+        failed = super(SlowClient, self).write(dlist)
+        time.sleep(0.3)
+        self.writes.append((start, time.time()))
+        return failed
+
+
+class PipelineTestCase(unittest.TestCase):
+    def test_pipelined_concurrent(self):
+        eclient = SlowClient()
+        cclient = SlowClient()
+        with Sync(eclient, cclient, concurrent=True, pipelined=True) as sync:
+            for cycle in range(2):
+                for client in (eclient, cclient):
+                    client.feed([Record.from_dict(dict(vint=cycle), uuid4(), cycle)])
+                sync.sync(cycle)
+
+        # Both sides read the second cycle while the first was still being written.
+        first_written = min(end for _, end in eclient.writes + cclient.writes)
+        self.assertLess(eclient.reads[1], first_written)
+        self.assertLess(cclient.reads[1], first_written)
+        self.assertEqual(2, eclient.written)
+        self.assertEqual(2, cclient.written)
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(PipelineTestCase)
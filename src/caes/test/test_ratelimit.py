@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from caes import metrics
+from caes.ratelimit import TokenBucket, RateLimiter
+
+
+class RateLimitTestCase(unittest.TestCase):
+    def test_unlimited(self):
+        bucket = TokenBucket()
+        self.assertEqual(0, bucket.acquire(10 ** 6))
+
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(100)
+
+        self.assertEqual(0, bucket.acquire(100))
+        self.assertAlmostEqual(0.1, bucket.acquire(10), delta=0.02)
+
+    def test_set_rate(self):
+        bucket = TokenBucket(1)
+        bucket.set_rate(None)
+
+        self.assertEqual(0, bucket.acquire(10 ** 6))
+
+    def test_non_positive_rate(self):
+        self.assertRaises(ValueError, TokenBucket, 0)
+        self.assertRaises(ValueError, TokenBucket(1).set_rate, -1)
+
+        limiter = RateLimiter('test.write', docs_per_second=10)
+        self.assertRaises(ValueError, limiter.set_rates, 20, 0)
+        self.assertEqual(10, limiter._docs.rate)
+
+    def test_throttled_seconds(self):
+        limiter = RateLimiter('test.write', docs_per_second=100, bytes_per_second=None)
+        limiter.throttle_entries([(dict(vint=i), None, i) for i in range(110)])
+
+        self.assertFalse(limiter.limits_bytes)
+        self.assertAlmostEqual(0.1, metrics.snapshot()['test.write.throttled_seconds'], delta=0.02)
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(RateLimitTestCase)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import cPickle
+import unittest
+
+from uuid import uuid4
+from caes import record as record_module
+from caes.record import Record, as_record
+
+
+class RecordTestCase(unittest.TestCase):
+    def setUp(self):
+        self.did = uuid4()
+        self.data = dict(vint=1, vstring="a")
+
+    def test_unpack(self):
+        data, did, ts = Record.from_dict(self.data, self.did, 10)
+
+        self.assertEqual(self.data, data)
+        self.assertEqual(self.did, did)
+        self.assertEqual(10, ts)
+
+    def test_index(self):
+        record = Record.from_dict(self.data, self.did, 10)
+
+        self.assertEqual(self.data, record[0])
+        self.assertEqual(self.did, record[1])
+        self.assertEqual(10, record[-1])
+        self.assertEqual((self.data, self.did, 10), record)
+
+    def test_no_data(self):
+        record = Record.from_dict(None, self.did, 10)
+
+        self.assertFalse(record.has_data)
+        self.assertEqual((None, self.did, 10), tuple(record))
+
+    def test_shared_shape(self):
+        first = Record.from_dict(self.data, self.did, 10)
+        second = Record.from_dict(dict(self.data, vint=2), uuid4(), 11)
+
+        self.assertIs(first.columns, second.columns)
+
+    def test_shapes_bounded(self):
+        for i in range(record_module.MAX_SHAPES + 10):
+            Record.from_dict({'v%d' % i: i}, self.did, 10)
+
+        self.assertLessEqual(len(record_module._shapes), record_module.MAX_SHAPES)
+
+    def test_compare_other_types(self):
+        record = Record.from_dict(self.data, self.did, 10)
+
+        self.assertIs(NotImplemented, record.__eq__(None))
+        self.assertIs(NotImplemented, record.__eq__((self.data, self.did)))
+        self.assertNotEqual(record, None)
+        self.assertNotEqual(record, [self.data, self.did, 10])
+        self.assertFalse(record == "abc")
+        self.assertEqual((self.data, self.did, 10), record)
+
+    def test_pickle(self):
+        record = Record.from_dict(self.data, self.did, 10)
+        loaded = cPickle.loads(cPickle.dumps(record, cPickle.HIGHEST_PROTOCOL))
+
+        self.assertEqual(record, loaded)
+        self.assertIs(record.columns, loaded.columns)
+
+    def test_as_record(self):
+        record = as_record((self.data, self.did, 10))
+
+        self.assertIsInstance(record, Record)
+        self.assertIs(record, as_record(record))
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(RecordTestCase)
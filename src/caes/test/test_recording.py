@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+
+from os.path import join
+from uuid import uuid4
+from caes.record import Record
+from caes.recording import Recorder, iter_recording
+
+
+class RecorderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.record_dir = tempfile.mkdtemp()
+        self.path = join(self.record_dir, 'traffic.gz')
+        self.docs = [Record.from_dict(dict(vint=i, vstring=str(i)), uuid4(), i) for i in range(25)]
+
+    def tearDown(self):
+        shutil.rmtree(self.record_dir)
+
+    def test_record(self):
+        recorder = Recorder(self.path, chunk_size=10)
+        recorder.cycle(9)
+        self.assertEqual(self.docs, list(recorder.tap('latest', 'es', self.docs)))
+        recorder.close()
+
+        records = list(iter_recording(self.path))
+
+        self.assertEqual('cycle', records[0][0])
+        self.assertEqual(9, records[0][1])
+        self.assertEqual([10, 10, 5], [len(r[2]) for r in records[1:]])
+        self.assertEqual(self.docs, [entry for r in records[1:] for entry in r[2]])
+
+    def test_append(self):
+        for since in (9, 19):
+            recorder = Recorder(self.path)
+            recorder.cycle(since)
+            recorder.close()
+
+        self.assertEqual([9, 19], [r[1] for r in iter_recording(self.path)])
+
+    def test_truncated(self):
+        recorder = Recorder(self.path)
+        recorder.cycle(9)
+        list(recorder.tap('write', 'cassandra', self.docs))
+        recorder.close()
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-20])
+
+        self.assertEqual(['cycle'], [r[0] for r in iter_recording(self.path)])
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(RecorderTestCase)
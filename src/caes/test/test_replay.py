@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+
+from os.path import join
+from uuid import uuid4
+from caes.record import Record
+from caes.recording import Recorder
+from caes.replay import Replayer
+
+
+class ReplayerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.record_dir = tempfile.mkdtemp()
+        self.path = join(self.record_dir, 'traffic.gz')
+
+        recorder = Recorder(self.path)
+        for cycle in range(3):
+            recorder.cycle(cycle)
+            for side in ('es', 'cassandra'):
+                docs = [Record.from_dict(dict(vint=i), uuid4(), cycle) for i in range(10)]
+                docs.append(Record(None, None, uuid4(), cycle))
+                list(recorder.tap('latest', side, docs))
+                list(recorder.tap('write', side, docs))
+        recorder.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.record_dir)
+
+    def test_replay(self):
+        report = Replayer(self.path).run()
+
+        self.assertEqual(3, report['cycles'])
+        self.assertEqual(66, report['read'])
+        self.assertEqual(60, report['written'])
+        self.assertEqual(60, report['recorded_writes'])
+        self.assertEqual(3, report['cycle_seconds']['count'])
+
+    def test_replay_pipelined(self):
+        report = Replayer(self.path, pipelined=True, queue_size=5, spill_dir=self.record_dir).run()
+
+        self.assertEqual(60, report['written'])
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(ReplayerTestCase)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+
+from os.path import join
+from uuid import uuid4
+from caes.retry import RetryLog
+
+
+class RetryLogTestCase(unittest.TestCase):
+    def setUp(self):
+        self.retry_dir = tempfile.mkdtemp()
+        self.path = join(self.retry_dir, 'retry.log')
+        self.retry = RetryLog(self.path, base_delay=10, max_delay=100, max_attempts=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.retry_dir)
+
+    def test_backoff(self):
+        doc = (dict(vint=1), uuid4(), 10)
+        self.retry.push([doc], now=0)
+
+        self.assertEqual([], self.retry.pop_due(now=4))
+        self.assertEqual([doc], self.retry.pop_due(now=10))
+
+        self.retry.push([doc], now=10)
+
+        self.assertEqual([], self.retry.pop_due(now=19))
+        self.assertEqual([doc], self.retry.pop_due(now=30))
+
+    def test_durable(self):
+        doc = (dict(vint=1), uuid4(), 10)
+        self.retry.push([doc], now=0)
+
+        retry = RetryLog(self.path)
+
+        self.assertEqual(1, len(retry))
+        self.assertEqual([doc], retry.pop_due(now=10))
+
+        # Still there until the retry is known to be written.
+        self.assertEqual(1, len(RetryLog(self.path)))
+
+        retry.push([], now=10)
+
+        self.assertEqual(0, len(RetryLog(self.path)))
+
+    def test_truncated(self):
+        first = (dict(vint=1), uuid4(), 10)
+        second = (dict(vint=2), uuid4(), 10)
+        self.retry.push([first], now=0)
+
+        with open(self.path, 'r+b') as f:
+            f.seek(0, 2)
+            f.truncate(f.tell() - 1)
+
+        retry = RetryLog(self.path)
+        self.assertEqual(0, len(retry))
+        retry.push([second], now=0)
+
+        self.assertEqual([second], RetryLog(self.path).pop_due(now=1000))
+
+    def test_success_forgets(self):
+        doc = (dict(vint=1), uuid4(), 10)
+        self.retry.push([doc], now=0)
+        self.retry.pop_due(now=10)
+        self.retry.push([], now=10)
+
+        self.assertEqual(0, len(self.retry))
+        self.assertEqual([], self.retry.pop_due(now=1000))
+
+    def test_max_attempts(self):
+        doc = (dict(vint=1), uuid4(), 10)
+        self.retry.push([doc], now=0)
+        for _ in range(3):
+            self.assertEqual([doc], self.retry.pop_due(now=1000))
+            self.retry.push([doc], now=0)
+
+        self.assertEqual(0, len(self.retry))
+
+    def test_overlapping_cycles(self):
+        first = (dict(vint=1), uuid4(), 10)
+        second = (dict(vint=2), uuid4(), 10)
+        self.retry.push([first], now=0)
+        self.retry.push([second], now=500)
+
+        # The second cycle pops its retries before the first one is done writing.
+        self.assertEqual([first], self.retry.pop_due(now=100))
+        self.assertEqual([second], self.retry.pop_due(now=1000))
+        self.retry.push([first], now=1000)
+        self.retry.push([second], now=1000)
+
+        # Both are on their second attempt, 10 to 20 seconds away.
+        self.assertEqual([], self.retry.pop_due(now=1009))
+        self.assertEqual(2, len(self.retry.pop_due(now=1020)))
+
+    def test_supersede(self):
+        did = uuid4()
+        self.retry.push([(dict(vint=1), did, 10)], now=0)
+
+        fresh = [(dict(vint=2), did, 11)]
+
+        self.assertEqual(fresh, list(self.retry.supersede(fresh)))
+        self.assertEqual([], self.retry.pop_due(now=1000))
+
+        self.retry.push([], now=1000)
+
+        self.assertEqual(0, len(RetryLog(self.path)))
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(RetryLogTestCase)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+from uuid import uuid4
+from caes.record import MAX_SHAPES, Record
+from caes.schema import TableSchema
+
+
+class Type(object):
+    def __init__(self, typename):
+        self.typename = typename
+
+
+class Column(object):
+    def __init__(self, typename):
+        self.data_type = Type(typename)
+
+
+class Table(object):
+    """
+    Stand-in for the driver's TableMetadata.
+    """
+
+    def __init__(self, **columns):
+        self.name = 'data'
+        self.columns = dict((name, Column(typename)) for name, typename in columns.iteritems())
+
+
+class TableSchemaTestCase(unittest.TestCase):
+    def setUp(self):
+        self.table = Table(did='uuid', vint='int', vstring='varchar', extra='text')
+        self.did = uuid4()
+
+    def test_coerce(self):
+        schema = TableSchema(self.table, 'did')
+        record = schema.conform(Record.from_dict(dict(vint="1", vstring=2), self.did, 10))
+
+        self.assertEqual(dict(vint=1, vstring=u"2"), record.data)
+        self.assertEqual(self.did, record.did)
+
+    def test_prune(self):
+        schema = TableSchema(self.table, 'did')
+        record = schema.conform(Record.from_dict(dict(vint=1, unknown=2, did=3), self.did, 10))
+
+        self.assertEqual(dict(vint=1), record.data)
+
+    def test_bad_value(self):
+        schema = TableSchema(self.table, 'did')
+        record = schema.conform(Record.from_dict(dict(vint="one", vstring="a"), self.did, 10))
+
+        self.assertEqual(dict(vstring="a"), record.data)
+
+    def test_overflow(self):
+        schema = TableSchema(self.table, 'did', overflow_column='extra')
+        record = schema.conform(Record.from_dict(dict(vint="one", vstring="a", unknown=2), self.did, 10))
+
+        data = record.data
+
+        self.assertEqual("a", data['vstring'])
+        self.assertEqual(dict(vint="one", unknown=2), json.loads(data['extra']))
+
+    def test_no_data(self):
+        schema = TableSchema(self.table, 'did')
+        record = Record(None, None, self.did, 10)
+
+        self.assertIs(record, schema.conform(record))
+
+    def test_plans_bounded(self):
+        schema = TableSchema(self.table, 'did')
+        for i in range(MAX_SHAPES + 10):
+            schema.conform(Record.from_dict({'vint': i, 'v%d' % i: i}, self.did, 10))
+
+        self.assertLessEqual(len(schema._plans), MAX_SHAPES)
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TableSchemaTestCase)
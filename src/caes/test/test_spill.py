@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from uuid import uuid4
+from caes.spill import SpillQueue
+
+
+class SpillQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.queue = SpillQueue(max_items=3, spill_dir=self.spill_dir)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.spill_dir)
+
+    def test_in_memory(self):
+        for i in range(3):
+            self.queue.put(i)
+
+        self.assertEqual(0, len(os.listdir(self.spill_dir)))
+        self.assertEqual([0, 1, 2], list(self.queue.drain()))
+
+    def test_spill_in_order(self):
+        docs = [(dict(vint=i, vstring=str(i)), uuid4(), i) for i in range(10)]
+        for doc in docs:
+            self.queue.put(doc)
+
+        self.assertEqual(10, len(self.queue))
+        self.assertEqual(1, len(os.listdir(self.spill_dir)))
+
+        self.assertEqual(docs, list(self.queue.drain()))
+        self.assertEqual(0, len(os.listdir(self.spill_dir)))
+
+    def test_put_while_draining(self):
+        for i in range(5):
+            self.queue.put(i)
+
+        results = [self.queue.get() for _ in range(4)]
+        self.queue.put(5)
+        self.queue.put(6)
+        results.extend(self.queue.drain())
+
+        self.assertEqual(range(7), results)
+
+    def test_get_empty(self):
+        self.assertRaises(IndexError, self.queue.get)
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(SpillQueueTestCase)
@@ -9,6 +9,7 @@ from cassandra.query import dict_factory
 from caes.client import ElasticSearchClient, CassandraClient
 from caes.test.utils import random_string
 from caes.sync import Sync
+from caes import metrics
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -259,6 +260,98 @@ class SyncTestCase(unittest.TestCase):
 
         self.assertDictEqual(dataother, self._get_elasticsearch_doc_by_id(did_other)['_source'])
 
+    def test_hot_cassandra_to_es(self):
+        did = uuid4()
+
+        for i in range(5):
+            self._outside_write_to_cassandra(dict(vint=i, vstring=str(i)), did, 10 + i)
+
+        self.sync.sync(9)
+
+        result = self._get_elasticsearch_doc_by_id(did)
+
+        self.assertIsNotNone(result)
+        self.assertEqual(14, result['_version'])
+        self.assertEqual(4, result['_source']['vint'])
+
+    def test_concurrent(self):
+        eclient = ElasticSearchClient(self.index, self.doc_type, concurrency=16)
+        cclient = CassandraClient(self.keyspace, self.data_column_family, concurrency=16)
+
+        docse = dict()
+        docsc = dict()
+        for i in range(100):
+            did = uuid4()
+            docse[did] = (dict(vint=i, vstring="e" + str(i)), did, 10)
+            did = uuid4()
+            docsc[did] = (dict(vint=i, vstring="c" + str(i)), did, 10)
+            self._outside_write_to_cassandra(*docsc[did])
+
+        self._outside_bulk_write_to_elasticsearch(docse.itervalues())
+
+        with Sync(eclient, cclient, concurrent=True) as sync:
+            sync.sync(9)
+
+        for did, (data, _, _) in docse.iteritems():
+            self.assertDictContainsSubset(data, self._get_cassandra_row_by_id(did))
+
+        for did, (data, _, _) in docsc.iteritems():
+            self.assertDictEqual(data, self._get_elasticsearch_doc_by_id(did)['_source'])
+
+    def test_pipelined(self):
+        docse = dict()
+        docsc = dict()
+        with Sync(self.eclient, self.cclient, pipelined=True) as sync:
+            for cycle in range(3):
+                for i in range(20):
+                    did = uuid4()
+                    docse[did] = (dict(vint=i, vstring="e" + str(i)), did, 10 + cycle)
+                    did = uuid4()
+                    docsc[did] = (dict(vint=i, vstring="c" + str(i)), did, 10 + cycle)
+                    self._outside_write_to_cassandra(*docsc[did])
+
+                self._outside_bulk_write_to_elasticsearch(docse.itervalues())
+
+                sync.sync(9 + cycle)
+
+        for did, (data, _, _) in docse.iteritems():
+            self.assertDictContainsSubset(data, self._get_cassandra_row_by_id(did))
+
+        for did, (data, _, _) in docsc.iteritems():
+            self.assertDictEqual(data, self._get_elasticsearch_doc_by_id(did)['_source'])
+
+    def test_skip_unchanged(self):
+        datae = dict(vint=1, vstring="Hi")
+        dide = uuid4()
+        skipped = metrics.counter('skipped.es_to_cassandra')
+
+        with Sync(self.eclient, self.cclient, fingerprint_cache_size=100) as sync:
+            self._outside_bulk_write_to_elasticsearch([(datae, dide, 10)])
+            sync.sync(9)
+
+            before = skipped.snapshot()
+
+            self._outside_bulk_write_to_elasticsearch([(datae, dide, 20)])
+            sync.sync(19)
+
+        self.assertEqual(before + 1, skipped.snapshot())
+        self.assertEqual(datae['vint'], self._get_cassandra_row_by_id(dide)['vint'])
+
+    def test_replace_clients(self):
+        datae = dict(vint=1, vstring="Hi")
+        dide = uuid4()
+
+        self._outside_bulk_write_to_elasticsearch([(datae, dide, 10)])
+        self.sync.sync(9)
+
+        cclient = CassandraClient(self.keyspace, self.data_column_family)
+        self.sync.replace_clients(self.eclient, cclient)
+
+        # What the replaced client wrote is still known as written by Caes-Sync.
+        self.assertEqual([(None, dide, 10)], cclient.latest(9))
+
+        cclient.close()
+
 
 def test_suite():
     return unittest.TestLoader().loadTestsFromTestCase(SyncTestCase)
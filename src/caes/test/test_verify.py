@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from uuid import uuid4
+from caes.fingerprint import fingerprint
+from caes.record import Record
+from caes.verify import MerkleTree, Verifier
+
+
+class ScanClient(object):
+    """
+    Stand-in for Verifier's clients: scan yields the given entries, get and fetch
+    look them up by did, write keeps the dids written and conform stores vint as an
+    int, with the other fields in the extra overflow column.
+    """
+
+    overflow_column = 'extra'
+
+    def __init__(self, entries):
+        self._entries = entries
+        self.scans = 0
+        self.written = set()
+
+    def scan(self):
+        self.scans += 1
+        return iter(self._entries)
+
+    def get(self, dids):
+        dids = set(dids)
+        return (entry for entry in self._entries if entry[1] in dids)
+
+    def fetch(self, entries):
+        rows = dict((entry[1], entry[0]) for entry in self._entries)
+        return ((rows[did], did, ts) for did, ts in entries)
+
+    def write(self, dlist):
+        self.written.update(entry[1] for entry in dlist)
+        return []
+
+    def conform(self, entry):
+        data, did, ts = entry
+        extra = dict((k, v) for k, v in data.iteritems() if k != 'vint')
+        return Record.from_dict(dict(vint=int(data['vint']), extra=repr(extra)), did, ts)
+
+
+class MerkleTreeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.docs = [(uuid4(), dict(vint=i, vstring=str(i))) for i in range(1000)]
+
+    def _tree(self, docs):
+        tree = MerkleTree(depth=3)
+        for did, data in docs:
+            tree.add(did, fingerprint(data))
+        return tree
+
+    def test_same(self):
+        tree1 = self._tree(self.docs)
+        tree2 = self._tree(reversed(self.docs))
+
+        self.assertEqual(set(), tree1.diff(tree2))
+
+    def test_fingerprint_ignores_nulls(self):
+        self.assertEqual(fingerprint(dict(vint=1)), fingerprint(dict(vint=1, vstring=None)))
+
+    def test_changed(self):
+        did, _ = self.docs[10]
+        docs = list(self.docs)
+        docs[10] = (did, dict(vint=-1, vstring="changed"))
+
+        self.assertEqual(set([did.hex[:3]]), self._tree(self.docs).diff(self._tree(docs)))
+
+    def test_missing(self):
+        did, _ = self.docs[10]
+        other, _ = self.docs[500]
+        docs = [d for d in self.docs if d[0] not in (did, other)]
+
+        diff = self._tree(self.docs).diff(self._tree(docs))
+
+        self.assertEqual(set([did.hex[:3], other.hex[:3]]), diff)
+
+    def test_verifier_conformed(self):
+        eclient = ScanClient([(dict(vint=str(data['vint']), vstring=data['vstring']), did, 1)
+                              for did, data in self.docs])
+        cclient = ScanClient([(dict(vint=data['vint'], extra="{}"), did) for did, data in self.docs])
+
+        self.assertEqual(set(), Verifier(eclient, cclient).divergent())
+
+    def _repair(self, max_leaf_docs):
+        docs = self.docs[:100]
+        eclient = ScanClient([(dict(vint=str(data['vint'])), did, 1) for did, data in docs])
+        rows = [(dict(vint=data['vint']), did) for did, data in docs[2:]]
+        rows.append((dict(vint=-1), docs[1][0]))
+        rows.append((dict(vint=-2), uuid4()))
+        cclient = ScanClient(rows)
+
+        verifier = Verifier(eclient, cclient, max_leaf_docs=max_leaf_docs)
+
+        self.assertEqual((2, 1), verifier.repair(verifier.divergent()))
+        self.assertEqual(set([docs[0][0], docs[1][0]]), cclient.written)
+        self.assertEqual(set([rows[-1][1]]), eclient.written)
+
+        return eclient.scans, cclient.scans
+
+    def test_repair_single_scan(self):
+        self.assertEqual((1, 1), self._repair(max_leaf_docs=256))
+
+    def test_repair_rescans_large_leaves(self):
+        self.assertEqual((2, 2), self._repair(max_leaf_docs=0))
+
+
+def test_suite():
+    return unittest.TestLoader().loadTestsFromTestCase(MerkleTreeTestCase)
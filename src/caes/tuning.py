@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from cassandra.cluster import Cluster
+from cassandra.policies import HostDistance, TokenAwarePolicy, DCAwareRoundRobinPolicy, RoundRobinPolicy
+
+CASSANDRA_PROFILES = {
+    'default': dict(),
+    'throughput': dict(load_balancing_policy='token_aware',
+                       compression=True,
+                       core_connections_per_host=2,
+                       max_connections_per_host=8,
+                       default_fetch_size=5000),
+    'latency': dict(load_balancing_policy='token_aware',
+                    compression=True,
+                    core_connections_per_host=4,
+                    max_connections_per_host=8,
+                    default_timeout=5)
+}
+
+ES_PROFILES = {
+    'default': dict(),
+    'throughput': dict(maxsize=32,
+                       timeout=30,
+                       retry_on_timeout=True),
+    'latency': dict(maxsize=16,
+                    timeout=5,
+                    retry_on_timeout=True,
+                    max_retries=1)
+}
+
+# Settings that go to the Session rather than to the Cluster.
+SESSION_OPTIONS = ('default_timeout', 'default_fetch_size')
+
+
+def _profile(profiles, name, params):
+    if name not in profiles:
+        raise ValueError("Unknown tuning profile %s." % name)
+
+    settings = dict(profiles[name])
+    settings.update(params or dict())
+    return settings
+
+
+def _load_balancing_policy(name, local_dc):
+    """
+    Returns the named policy. The driver doesn't work out the local datacenter, and
+    takes every host as remote, and unused, without it: dc_aware needs local_dc,
+    and token_aware routes over plain round robin when it is not set.
+    """
+    if name == 'round_robin':
+        return RoundRobinPolicy()
+    elif name == 'dc_aware':
+        if not local_dc:
+            raise ValueError("The dc_aware load balancing policy needs local_dc.")
+        return DCAwareRoundRobinPolicy(local_dc)
+    elif name == 'token_aware':
+        return TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc) if local_dc else RoundRobinPolicy())
+
+    raise ValueError("Unknown load balancing policy %s." % name)
+
+
+def cassandra_cluster(params, profile='default'):
+    """
+    Builds a Cluster from the driver params layered over the named profile, and
+    returns it with the options to set on its sessions. On top of Cluster's own
+    kwargs, params may have:
+
+    - load_balancing_policy: round_robin, dc_aware (which needs local_dc) or
+      token_aware, DC aware with local_dc;
+    - core_connections_per_host and max_connections_per_host, for local hosts;
+    - default_timeout and default_fetch_size, set on each session.
+    """
+    logger = logging.getLogger(__name__)
+
+    settings = _profile(CASSANDRA_PROFILES, profile, params)
+
+    session_options = dict((k, settings.pop(k)) for k in SESSION_OPTIONS if k in settings)
+    core_connections = settings.pop('core_connections_per_host', None)
+    max_connections = settings.pop('max_connections_per_host', None)
+    local_dc = settings.pop('local_dc', None)
+
+    if isinstance(settings.get('load_balancing_policy'), basestring):
+        settings['load_balancing_policy'] = _load_balancing_policy(settings['load_balancing_policy'], local_dc)
+
+    logger.debug("Cassandra driver settings: %s", settings)
+
+    cluster = Cluster(**settings)
+
+    try:
+        if max_connections is not None:
+            cluster.set_max_connections_per_host(HostDistance.LOCAL, max_connections)
+        if core_connections is not None:
+            cluster.set_core_connections_per_host(HostDistance.LOCAL, core_connections)
+    except Exception as e:
+        logger.warning("Can't set connections per host: %s", e)
+
+    return cluster, session_options
+
+
+def es_params(params, profile='default'):
+    """
+    Returns the Elasticsearch kwargs from the driver params layered over the
+    named profile.
+    """
+    return _profile(ES_PROFILES, profile, params)
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+
+def coalesce(dlist):
+    """
+    Keeps only the most recent (data, did, ts) entry for each did, preserving
+    the order in which the surviving entries first appeared.
+    """
+    latest = dict()
+    order = []
+    for entry in dlist:
+        did, ts = entry[1], entry[2]
+        if did not in latest:
+            order.append(did)
+            latest[did] = entry
+        elif ts > latest[did][2]:
+            latest[did] = entry
+
+    return [latest[did] for did in order]
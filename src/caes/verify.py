@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import logging
+import time
+
+from caes.fingerprint import fingerprint
+from caes.sync import App
+
+HEX = '0123456789abcdef'
+
+
+class MerkleTree(object):
+    """
+    Hash tree over UUID ranges: the node for a prefix of the UUID's hex digits holds
+    the XOR of the hashes of every (did, fingerprint) pair under it, so pairs can be
+    added in any order while streaming. Leaves are prefixes of depth digits.
+    """
+
+    def __init__(self, depth=3):
+        self._depth = depth
+        self._levels = [dict() for _ in range(depth + 1)]
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, did, fp):
+        h = int(hashlib.md5(did.bytes + fp).hexdigest(), 16)
+        prefix = did.hex[:self._depth]
+        for level, nodes in enumerate(self._levels):
+            key = prefix[:level]
+            nodes[key] = nodes.get(key, 0) ^ h
+        self._count += 1
+
+    def node(self, prefix):
+        return self._levels[len(prefix)].get(prefix, 0)
+
+    def diff(self, other):
+        """
+        Compares both trees top-down and returns the leaf prefixes that differ.
+        """
+        divergent = [''] if self.node('') != other.node('') else []
+        for _ in range(self._depth):
+            divergent = [p + c for p in divergent for c in HEX if self.node(p + c) != other.node(p + c)]
+
+        return set(divergent)
+
+
+class Verifier(object):
+    """
+    Finds the documents that differ between ES and Cassandra with a hash tree of
+    each. While building them, the (did, fingerprint) pairs of each leaf are kept,
+    up to max_leaf_docs of them, so that repair can tell the documents of divergent
+    leaves apart without scanning both stores again.
+    """
+
+    def __init__(self, eclient, cclient, depth=3, source='es', max_leaf_docs=256):
+        self.__logger = logging.getLogger(__name__)
+
+        if source not in ('es', 'cassandra'):
+            raise ValueError("Unknown source %s." % source)
+
+        self._eclient = eclient
+        self._cclient = cclient
+        self._depth = depth
+        self._source = source
+        self._max_leaf_docs = max_leaf_docs
+        self._eleaves = None
+        self._cleaves = None
+
+    def _fingerprint(self, data):
+        """
+        Fingerprints data as stored in Cassandra, leaving out the overflow column,
+        whose JSON need not come out the same on both sides.
+        """
+        overflow_column = self._cclient.overflow_column
+        if overflow_column is not None and overflow_column in data:
+            data = dict(data)
+            del data[overflow_column]
+
+        return fingerprint(data)
+
+    def _efingerprint(self, entry):
+        """
+        Fingerprints an ES entry as it would be stored in Cassandra.
+        """
+        return self._fingerprint(self._cclient.conform(entry).data)
+
+    def _keep(self, leaves, did, fp):
+        """
+        Keeps (did, fp) in its leaf, unless the leaf already holds max_leaf_docs pairs,
+        in which case its pairs are dropped and the leaf is marked with None.
+        """
+        prefix = did.hex[:self._depth]
+        docs = leaves.setdefault(prefix, dict())
+        if docs is None:
+            return
+
+        if len(docs) >= self._max_leaf_docs:
+            leaves[prefix] = None
+        else:
+            docs[did] = fp
+
+    def _trees(self):
+        etree = MerkleTree(self._depth)
+        self._eleaves = dict()
+        for entry in self._eclient.scan():
+            if entry[0] is not None:
+                fp = self._efingerprint(entry)
+                etree.add(entry[1], fp)
+                self._keep(self._eleaves, entry[1], fp)
+
+        ctree = MerkleTree(self._depth)
+        self._cleaves = dict()
+        for data, did in self._cclient.scan():
+            fp = self._fingerprint(data)
+            ctree.add(did, fp)
+            self._keep(self._cleaves, did, fp)
+
+        self.__logger.info("Hashed %d ES docs and %d Cassandra rows.", len(etree), len(ctree))
+
+        return etree, ctree
+
+    def _leaf_fingerprints(self, prefixes):
+        """
+        Returns the fingerprints of the ES docs and of the Cassandra rows under
+        prefixes, by did. Leaves too large to have been kept are scanned for again.
+        """
+        if self._eleaves is None:
+            self._trees()
+
+        efps = dict()
+        cfps = dict()
+        rescan = set()
+        for prefix in prefixes:
+            edocs = self._eleaves.get(prefix, dict())
+            cdocs = self._cleaves.get(prefix, dict())
+            if edocs is None or cdocs is None:
+                rescan.add(prefix)
+            else:
+                efps.update(edocs)
+                cfps.update(cdocs)
+
+        if len(rescan) > 0:
+            self.__logger.info("%d divergent ranges hold over %d docs, scanning them again.",
+                               len(rescan), self._max_leaf_docs)
+
+            for entry in self._eclient.scan():
+                if entry[0] is not None and entry[1].hex[:self._depth] in rescan:
+                    efps[entry[1]] = self._efingerprint(entry)
+
+            for data, did in self._cclient.scan():
+                if did.hex[:self._depth] in rescan:
+                    cfps[did] = self._fingerprint(data)
+
+        return efps, cfps
+
+    def divergent(self):
+        """
+        Returns the UUID prefixes whose documents differ between ES and Cassandra.
+        """
+        etree, ctree = self._trees()
+        return etree.diff(ctree)
+
+    def repair(self, prefixes, dry_run=False):
+        """
+        Re-syncs the documents under prefixes that differ. A document missing on one
+        side is copied from the other, and one that differs is copied from source.
+        Only the documents copied are read again, by did. Returns the number of
+        documents copied to Cassandra and to ES.
+        """
+        efps, cfps = self._leaf_fingerprints(prefixes)
+
+        to_cassandra = []
+        to_es = []
+        for did, efp in efps.iteritems():
+            if did not in cfps or (cfps[did] != efp and self._source == 'es'):
+                to_cassandra.append(did)
+            elif cfps[did] != efp:
+                to_es.append(did)
+
+        to_es.extend(did for did in cfps if did not in efps)
+
+        self.__logger.info("%d docs to copy to Cassandra, %d to ES.", len(to_cassandra), len(to_es))
+
+        if not dry_run:
+            failed = self._cclient.write(self._eclient.get(to_cassandra))
+
+            # ES only takes the copy if its version is newer than what it has.
+            ts = int(time.time())
+            failed.extend(self._eclient.write(self._cclient.fetch((did, ts) for did in to_es)))
+
+            for _, did, _ in failed:
+                self.__logger.error("Couldn't repair %s.", str(did))
+
+        return len(to_cassandra), len(to_es)
+
+
+def verify():
+    parser = argparse.ArgumentParser(description="Finds and re-syncs documents that differ between "
+                                                 "ElasticSearch and Cassandra.")
+    parser.add_argument('--depth', type=int, default=3,
+                        help="Number of UUID hex digits per hash tree leaf.")
+    parser.add_argument('--source', choices=['es', 'cassandra'], default='es',
+                        help="Which side wins when a document differs.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Only report the divergent documents.")
+    parser.add_argument('--max-leaf-docs', type=int, default=256,
+                        help="Number of documents per hash tree leaf remembered for the repair.")
+    args = parser.parse_args()
+
+    eclient, cclient, _, _ = App()._config()
+
+    verifier = Verifier(eclient, cclient, depth=args.depth, source=args.source,
+                        max_leaf_docs=args.max_leaf_docs)
+    try:
+        prefixes = verifier.divergent()
+        print "%d divergent UUID ranges." % len(prefixes)
+
+        if len(prefixes) > 0:
+            to_cassandra, to_es = verifier.repair(prefixes, dry_run=args.dry_run)
+            print "%d docs %s to Cassandra, %d to ES." % (to_cassandra,
+                                                          "to copy" if args.dry_run else "copied",
+                                                          to_es)
+    finally:
+        eclient.close()
+        cclient.close()